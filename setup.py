@@ -53,12 +53,13 @@ setup(
     python_requires=">=3.10",
     install_requires=[
         "numpy",
-        "pandas",
         "scipy",
         "matplotlib",
         "pyyaml",
     ],
-    extras_require={},
+    extras_require={
+        "pyarrow": ["pyarrow"],
+    },
     entry_points={
         "console_scripts": [
             "sonnetsuiteshelper = sonnetsuiteshelper.cli:main",
@@ -1,11 +1,12 @@
+import itertools
+import math
 import os
+from typing import TYPE_CHECKING
 
 import numpy as np
-import pandas as pd
-from matplotlib import pyplot as plt
-from scipy.interpolate import UnivariateSpline
-from scipy.optimize import curve_fit
-from scipy.signal import find_peaks
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
 
 
 def S21_mag_fit(freqs, f0, qr, qc):
@@ -15,9 +16,75 @@ def S21_mag_fit(freqs, f0, qr, qc):
     return np.abs(s21)
 
 
-def volts_to_db(S21_volts):
-    """Transforming power S21 volts**2 into decibells."""
-    return 20 * np.log10(S21_volts)
+def S21_mag_fit_jac(freqs, f0, qr, qc):
+    """Analytic jacobian of S21_mag_fit with respect to f0, qr and qc.
+
+    Returns an array of shape (len(freqs), 3).
+    """
+    xr = freqs / f0 - 1
+    a = qr / qc
+    b = 2 * qr * xr
+    denom = 1 + b**2
+    s21_re = 1 - a / denom
+    s21_im = a * b / denom
+    s21_mag = np.hypot(s21_re, s21_im)
+
+    # derivatives of |s21| with respect to a=qr/qc and b=2*qr*xr
+    d_mag_d_a = (-s21_re + s21_im * b) / (denom * s21_mag)
+    d_mag_d_b = a * (2 * b * s21_re + (1 - b**2) * s21_im) / (denom**2 * s21_mag)
+
+    jac = np.empty((len(freqs), 3))
+    jac[:, 0] = d_mag_d_b * (-2 * qr * freqs / f0**2)
+    jac[:, 1] = d_mag_d_a / qc + d_mag_d_b * 2 * xr
+    jac[:, 2] = d_mag_d_a * (-qr / qc**2)
+    return jac
+
+
+def _S21_mag_fit_residuals(params, freqs, S21_mag):
+    """Residuals of S21_mag_fit for params=[f0, qr, qc] against S21_mag."""
+    return S21_mag_fit(freqs, *params) - S21_mag
+
+
+def _S21_mag_fit_residuals_jac(params, freqs, S21_mag):
+    """Jacobian of _S21_mag_fit_residuals."""
+    return S21_mag_fit_jac(freqs, *params)
+
+
+def volts_to_db(S21_volts, out=None):
+    """Transforming power S21 volts**2 into decibells.
+
+    If an out array is given the result is written into that rather than a
+    newly allocated array.
+    """
+    S21_dB = np.log10(S21_volts, out=out)
+    S21_dB *= 20
+    return S21_dB
+
+
+def _min_max_decimate(y_data, n_buckets: int):
+    """Get the sorted indices of the min and max y_data point in each of
+    n_buckets equal chunks of y_data."""
+    bucket_size = -(-len(y_data) // n_buckets)
+    n_full = len(y_data) // bucket_size
+    n_in_full = n_full * bucket_size
+
+    full_buckets = np.asarray(y_data[:n_in_full]).reshape(n_full, bucket_size)
+    offsets = np.arange(n_full) * bucket_size
+    indices = [offsets + full_buckets.argmin(axis=1), offsets + full_buckets.argmax(axis=1)]
+
+    tail = y_data[n_in_full:]
+    if len(tail):
+        indices.append(np.array([n_in_full + tail.argmin(), n_in_full + tail.argmax()]))
+
+    return np.unique(np.concatenate(indices))
+
+
+# The scale from Hz and the labels for each frequency x axis that can be plotted.
+_FREQ_AX_LOOKUP = {
+    "freq_Hz": {"scale": 1.0, "label": "freq", "units": "Hz"},
+    "freq_MHz": {"scale": 1e-6, "label": "freq", "units": "MHz"},
+    "freq_GHz": {"scale": 1e-9, "label": "freq", "units": "GHz"},
+}
 
 
 class SonnetCSVOutputFile:
@@ -43,10 +110,10 @@ class SonnetCSVOutputFile:
 
     def __init__(self, file_name: str, file_path: str = "", parameter: str = "S-Param", complex: str = "Real-Imag"):
         # if no .csv file extention it is added.
-        if file_name[-4:] != ".csv":
+        if not file_name.endswith(".csv"):
             file_name = file_name + ".csv"
 
-        self.file_name = file_name[:-4]
+        self.file_name = file_name.removesuffix(".csv")
 
         live_file = os.path.join(file_path, file_name)
 
@@ -56,45 +123,145 @@ class SonnetCSVOutputFile:
 
         # read csv
 
-        csv_col_names = ["Frequency (GHz)", "RE[S11]", "IM[S11]", "RE[S12]", "IM[S12]", "RE[S21]", "IM[S21]", "RE[S22]", "IM[S22]"]
+        ports = (1, 2)
+        csv_col_names = ["Frequency (GHz)"] + [
+            col_name for port1, port2 in itertools.product(ports, ports) for col_name in (f"RE[S{port1}{port2}]", f"IM[S{port1}{port2}]")
+        ]
+
+        # find the start of the file's data then read it all in one go
+        skip_row = self._get_data_start_row(live_file)
+        # pyarrow's csv reader is used when it is installed, otherwise np.loadtxt.
+        try:
+            file_data = self._read_csv_with_pyarrow(live_file, csv_col_names, skip_row)
+        except ImportError:
+            file_data = np.loadtxt(
+                live_file, delimiter=",", skiprows=skip_row, usecols=range(len(csv_col_names)), dtype=np.float64, ndmin=2
+            )
+
+        # file_data has one column per name in file_data_col_names.
+        self.file_data = file_data
+        self.file_data_col_names = csv_col_names
+        self.freqs = file_data[:, 0] * 1e9  # converty GHz to Hz
 
-        # itterate to find start of the file's data
-        skip_row = 2
-        file_data = pd.read_csv(live_file, names=csv_col_names, skiprows=skip_row)
+        # All the S params in one contiguous array of shape (freqs, port1, port2)
+        # so that S_params[:, 1, 0] is S21. The RE and IM columns alternate so
+        # each row of the float64 block is already laid out as complex128
+        # values and S_params is just a view of it.
+        re_im_block = np.ascontiguousarray(file_data[:, 1:])
+        self.S_params = re_im_block.view(np.complex128).reshape(len(file_data), len(ports), len(ports))
 
-        while isinstance(file_data["Frequency (GHz)"][0], str):
-            file_data = pd.read_csv(live_file, names=csv_col_names, skiprows=skip_row)
-            skip_row += 1
+        # The S mag and S mag dB arrays are computed once per port pair.
+        self._S_mag_cache = {}
+        self._S_mag_dB_cache = {}
 
-        self.file_data = file_data
-        self.freqs = np.array(self.file_data["Frequency (GHz)"] * 1e9)  # converty GHz to Hz
-        self.S21_mag = np.array(np.abs(file_data["RE[S21]"] + 1j * file_data["IM[S21]"]))
-        self.S21_mag_dB = volts_to_db(self.S21_mag)
+        self.S21_mag = self.get_S_mag(2, 1)
+        self.S21_mag_dB = self.get_S_mag_dB(2, 1)
+
+        self._peak_index = None
+        self._Q_values = None
 
     def __str__(self):
         return f"SonnetCSVOutputFile\n\tname: {self.file_name}\n\tParameter: {self.parameter}\n\tComplex: {self.complex}"
 
-    def _get_indices_around_peak(self, y_data: list, no_points_around_peak: int = 200) -> list:
-        """Get the indices around the peak in the data."""
-        peaks_in_data = find_peaks(y_data, height=5, distance=100)
-        if len(peaks_in_data[0]) == 0:
-            raise (Exception("No Peaks found in data"))
+    def _get_data_start_row(self, live_file: str) -> int:
+        """Get the index of the first line of numeric data in the csv, i.e.
+        the number of header lines to skip."""
+        with open(live_file) as f:
+            for line_no, line in enumerate(f):
+                try:
+                    float(line.split(",")[0])
+                except ValueError:
+                    continue
+                return line_no
+
+        raise (Exception(f"No data found in file: {live_file}"))
+
+    def _read_csv_with_pyarrow(self, live_file: str, csv_col_names: list, skip_row: int) -> np.ndarray:
+        """Read the data in the csv with pyarrow's multithreaded csv reader,
+        pinning every column to float64.
+
+        Returns an array of shape (rows, len(csv_col_names)). Raises an
+        ImportError if pyarrow is not installed.
+        """
+        # pyarrow is slow to import so only do it when a csv is read.
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+
+        table = pa_csv.read_csv(
+            live_file,
+            read_options=pa_csv.ReadOptions(skip_rows=skip_row, column_names=csv_col_names),
+            convert_options=pa_csv.ConvertOptions(column_types={col_name: pa.float64() for col_name in csv_col_names}),
+        )
+        # The column buffers are copied out directly as pyarrow's to_numpy
+        # pulls in pandas on first use.
+        file_data = np.empty((table.num_rows, table.num_columns), dtype=np.float64)
+        for col_no, col in enumerate(table.columns):
+            row_no = 0
+            for chunk in col.chunks:
+                if chunk.null_count:
+                    chunk = chunk.fill_null(math.nan)
+                file_data[row_no : row_no + len(chunk), col_no] = np.frombuffer(
+                    chunk.buffers()[1], dtype=np.float64, count=len(chunk), offset=chunk.offset * 8
+                )
+                row_no += len(chunk)
+
+        return file_data
+
+    def get_S_mag(self, port1: int, port2: int) -> np.ndarray:
+        """Get the magnitude of the S param between port1 and port2, e.g.
+        get_S_mag(2, 1) is the S21 mag.
+
+        This is only calculated once for each pair of ports and then reused.
+        """
+        key = (port1, port2)
+        if key not in self._S_mag_cache:
+            self._S_mag_cache[key] = np.abs(self.S_params[:, port1 - 1, port2 - 1])
+
+        return self._S_mag_cache[key]
+
+    def get_S_mag_dB(self, port1: int, port2: int) -> np.ndarray:
+        """Get the magnitude in dB of the S param between port1 and port2,
+        e.g. get_S_mag_dB(2, 1) is the S21 mag in dB.
+
+        This is only calculated once for each pair of ports and then reused.
+        """
+        key = (port1, port2)
+        if key not in self._S_mag_dB_cache:
+            self._S_mag_dB_cache[key] = volts_to_db(self.get_S_mag(port1, port2))
+
+        return self._S_mag_dB_cache[key]
+
+    def _get_peak_index(self) -> int:
+        """Get the index of the peak in the S21_mag_dB data.
+
+        This is only searched for once and then reused.
+        """
+        if self._peak_index is None:
+            # scipy.signal is slow to import so only do it when it is needed.
+            from scipy.signal import find_peaks
+
+            peaks_in_data = find_peaks(-self.S21_mag_dB, height=5, distance=100)
+            if len(peaks_in_data[0]) == 0:
+                raise (Exception("No Peaks found in data"))
+
+            self._peak_index = peaks_in_data[0][0]
 
-        peak_index = peaks_in_data[0][0]
+        return self._peak_index
+
+    def _get_indices_around_peak(self, no_points_around_peak: int = 200) -> range:
+        """Get the indices around the peak in the S21_mag_dB data."""
+        peak_index = self._get_peak_index()
 
         # Get the range around the peak being sure to not overflow the original
         # array by indexing outside its length
         lower_range_index = max([peak_index - no_points_around_peak, 0])
-        upper_range_index = min([peak_index + no_points_around_peak, len(y_data)])
+        upper_range_index = min([peak_index + no_points_around_peak, len(self.S21_mag_dB)])
 
         indices_around_peak = range(lower_range_index, upper_range_index)
-        indices_around_peak = range(peak_index - no_points_around_peak, peak_index + no_points_around_peak)
 
         return indices_around_peak
 
-    def plot_data(
-        self, x_ax: str = "freq_MHz", y_ax: str = "S21_mag_dB", data_points_around_peak: int = 0, fig_ax: plt.Axes = None
-    ) -> None:
+    def plot_data(self, x_ax: str = "freq_MHz", y_ax: str = "S21_mag_dB", data_points_around_peak: int = 0, fig_ax: "Axes" = None) -> None:
         """Plots the data in the csv, default is plotting all data in the
         S21_mag_dB against freq. This can take differing x_ax and y_ax values
         to plot. Can also just plot region around the peak in the data by
@@ -122,24 +289,23 @@ class SonnetCSVOutputFile:
             extra data to the plot.
         """
 
-        x_lookup = {
-            "freq_Hz": {"data": self.freqs, "label": "freq", "units": "Hz"},
-            "freq_MHz": {"data": self.freqs * 1e-6, "label": "freq", "units": "MHz"},
-            "freq_GHz": {"data": self.freqs * 1e-9, "label": "freq", "units": "GHz"},
-        }
+        from matplotlib import pyplot as plt
+
+        x_lookup = _FREQ_AX_LOOKUP
 
         y_lookup = {
             "S21_mag": {"data": self.S21_mag, "label": "S21 mag", "units": "V**2"},
-            "S21_mag_dB": {"data": volts_to_db(self.S21_mag), "label": "S21 mag", "units": "dB"},
+            "S21_mag_dB": {"data": self.S21_mag_dB, "label": "S21 mag", "units": "dB"},
         }
 
-        if x_ax not in x_lookup.keys():
-            raise KeyError("{x_ax} is an invalid value for x_ax. Valid values are {list(x_lookup.keys())}")
+        if x_ax not in x_lookup:
+            raise KeyError(f"{x_ax} is an invalid value for x_ax. Valid values are {list(x_lookup)}")
 
-        if y_ax not in y_lookup.keys():
-            raise KeyError("{y_ax} is an invalid value for y_ax. Valid values are {list(y_lookup.keys())}")
+        if y_ax not in y_lookup:
+            raise KeyError(f"{y_ax} is an invalid value for y_ax. Valid values are {list(y_lookup)}")
 
-        x_data = x_lookup[x_ax]["data"]
+        x_data = self.freqs
+        x_scale = x_lookup[x_ax]["scale"]
         x_label = x_lookup[x_ax]["label"]
         x_units = x_lookup[x_ax]["units"]
 
@@ -151,16 +317,19 @@ class SonnetCSVOutputFile:
         col = "C0"
 
         if data_points_around_peak != 0:
-            region = self._get_indices_around_peak(-self.S21_mag_dB, no_points_around_peak=data_points_around_peak)
-            y_data = y_lookup[y_ax]["data"][region]
-            x_data = x_lookup[x_ax]["data"][region]
+            region = self._get_indices_around_peak(no_points_around_peak=data_points_around_peak)
+            y_data = y_data[region]
+            x_data = x_data[region]
             title += f"   ({data_points_around_peak}_points_around_peak)"
             col = "C1"
 
+        # Only scale the freqs that are actually plotted.
+        if x_scale != 1.0:
+            x_data = x_data * x_scale
+
         # If a matplotlib figure axes is defined just plot the data to that.
         if fig_ax:
-            fig_ax.scatter(x_data, y_data, s=0.5, color=col)
-            fig_ax.plot(x_data, y_data, linewidth=0.2, alpha=0.3, color=col)
+            self._plot_xy(fig_ax, x_data, y_data, col)
             fig_ax.set_xlabel(f"{x_label}     ({x_units})")
             fig_ax.set_ylabel(f"{y_label}     ({y_units})")
             return
@@ -172,8 +341,7 @@ class SonnetCSVOutputFile:
 
         ax0 = plt.subplot(grid[0, 0])
 
-        ax0.scatter(x_data, y_data, s=0.5, color=col)
-        ax0.plot(x_data, y_data, linewidth=0.2, alpha=0.3, color=col)
+        self._plot_xy(ax0, x_data, y_data, col)
 
         ax0.set_title(title, loc="left")
         ax0.set_xlabel(f"{x_label}     ({x_units})")
@@ -182,6 +350,35 @@ class SonnetCSVOutputFile:
 
         fig.show()
 
+    def _plot_xy(self, ax: "Axes", x_data, y_data, col: str) -> None:
+        """Plot the points and a faint line joining them as a single line
+        artist.
+
+        When there are many more points than horizontal pixels in the
+        figure the data is reduced to the min and max point per pixel
+        which draws the same envelope.
+        """
+        from matplotlib.colors import to_rgba
+
+        if len(x_data) > 10_000:
+            fig = ax.get_figure()
+            n_pixels = int(fig.get_size_inches()[0] * fig.dpi)
+            if len(x_data) > 2 * n_pixels:
+                indices = _min_max_decimate(y_data, n_pixels)
+                x_data = x_data[indices]
+                y_data = y_data[indices]
+
+        ax.plot(
+            x_data,
+            y_data,
+            linewidth=0.2,
+            color=to_rgba(col, alpha=0.3),
+            marker=".",
+            markersize=0.5**0.5,
+            markerfacecolor=col,
+            markeredgecolor=col,
+        )
+
     def get_resonant_freq(self) -> float:
         """Get the resonant frequency (*in Hz*) from the data.
 
@@ -191,14 +388,29 @@ class SonnetCSVOutputFile:
             The resonant frequency of the peak in the data.
         """
         # find the peak in the data
-        indices_around_peak = self._get_indices_around_peak(-self.S21_mag_dB)
+        indices_around_peak = self._get_indices_around_peak()
 
         # Get the freqs and S21_mag around the peak
         freqs_around_peak = self.freqs[indices_around_peak]
         S21_mag_dB_around_peak = self.S21_mag_dB[indices_around_peak]
 
         # take the freq at the lowest point in the peak
-        resonant_freq = freqs_around_peak[S21_mag_dB_around_peak.argmin()]
+        min_index = int(S21_mag_dB_around_peak.argmin())
+        resonant_freq = freqs_around_peak[min_index]
+
+        # refine this to between the freq points by fitting a parabola through
+        # the lowest point and the points either side of it. The freq points
+        # are not evenly spaced in an adaptive sweep so the vertex uses all
+        # three freqs.
+        if 0 < min_index < len(S21_mag_dB_around_peak) - 1:
+            f0, f1, f2 = freqs_around_peak[min_index - 1 : min_index + 2]
+            y0, y1, y2 = S21_mag_dB_around_peak[min_index - 1 : min_index + 2]
+            lo_term = (f1 - f0) * (y1 - y2)
+            hi_term = (f1 - f2) * (y1 - y0)
+            # This is only negative when the parabola curves upwards.
+            denom = lo_term - hi_term
+            if denom < 0:
+                resonant_freq = f1 - 0.5 * ((f1 - f0) * lo_term - (f1 - f2) * hi_term) / denom
 
         return resonant_freq
 
@@ -211,9 +423,15 @@ class SonnetCSVOutputFile:
         Q_Values : list
             list containing [QR, QC, QI].
         """
+        # The fit is only done once and then reused.
+        if self._Q_values is not None:
+            return list(self._Q_values)
+
+        # scipy.optimize is slow to import so only do it when it is needed.
+        from scipy.optimize import leastsq
 
         # find the peak in the data
-        indices_around_peak = self._get_indices_around_peak(-self.S21_mag_dB)
+        indices_around_peak = self._get_indices_around_peak()
 
         # Get the freqs and S21_mag around the peak
         freqs_around_peak = self.freqs[indices_around_peak]
@@ -222,16 +440,56 @@ class SonnetCSVOutputFile:
         init_QR_guess = 10e3
         init_QC_guess = 2 * init_QR_guess
         init_guesses = np.array([self.get_resonant_freq(), init_QR_guess, init_QC_guess])
-        popt, pcov = curve_fit(S21_mag_fit, freqs_around_peak, S21_mag_around_peak, p0=init_guesses)
+        popt, ier = leastsq(
+            _S21_mag_fit_residuals,
+            init_guesses,
+            args=(freqs_around_peak, S21_mag_around_peak),
+            Dfun=_S21_mag_fit_residuals_jac,
+        )
+        if ier not in [1, 2, 3, 4]:
+            raise (RuntimeError("Optimal parameters not found for the S21 mag fit."))
         QR = popt[1]
         QC = popt[2]
         QI = 1 / ((1 / QR) - (1 / QC))
 
         Q_Values = [QR, QC, QI]
+        self._Q_values = tuple(Q_Values)
 
         return Q_Values
 
     def get_three_dB_BW(self) -> float:
         """Get the 3dB BW from the peak in the data."""
-        spline = UnivariateSpline(self.freqs, volts_to_db(self.S21_mag) + 3.0, s=0)
-        return abs(spline.roots()[1] - spline.roots()[0])
+        # find where the data crosses -3dB rather than building a spline over
+        # all of the data.
+        S21_mag_dB_plus_3 = self.S21_mag_dB + 3.0
+        below = np.signbit(S21_mag_dB_plus_3)
+        crossings = np.flatnonzero(below[1:] ^ below[:-1])
+        if len(crossings) < 2:
+            raise (Exception("Could not find the 3dB points in the data"))
+
+        roots = [self._get_crossing_freq(S21_mag_dB_plus_3, i) for i in crossings[:2]]
+        return abs(roots[1] - roots[0])
+
+    def _get_crossing_freq(self, y_data, index: int, no_points_around_crossing: int = 20) -> float:
+        """Get the freq where y_data crosses zero between index and index+1.
+
+        This fits an interpolating cubic spline through the points around
+        the crossing. Away from the ends of the data this is the same as a
+        spline over all of the data, but much cheaper. It falls back to a
+        linear interpolation if the spline has no root in the interval.
+        """
+        # scipy.interpolate is slow to import so only do it when it is needed.
+        from scipy.interpolate import CubicSpline
+
+        f_lo = self.freqs[index]
+        f_hi = self.freqs[index + 1]
+
+        window = slice(max(index + 1 - no_points_around_crossing, 0), min(index + 1 + no_points_around_crossing, len(y_data)))
+        local_spline = CubicSpline(self.freqs[window], y_data[window])
+        for root in local_spline.roots(extrapolate=False):
+            if f_lo <= root <= f_hi:
+                return root
+
+        y_lo = y_data[index]
+        y_hi = y_data[index + 1]
+        return f_lo - y_lo * (f_hi - f_lo) / (y_hi - y_lo)
@@ -1,6 +1,261 @@
 import os
 import re
-from typing import Dict
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Literal, Mapping, Sequence
+
+# Patterns for each kind of part of a Sonnet file generate_file_like can edit.
+# Each starts with a literal so re can skip quickly through the file to the
+# lines that could match, and only the patterns for the kinds of edits asked
+# for are searched. The parts of each match that are kept as they are have
+# their own group so the replacement can be built from them directly.
+_GENERAL_METAL_PATTERN = re.compile(
+    rb'(?P<general_metal_head>MET "(?P<general_metal_name>[^"]*)" \d+ SUP)(?: [+\-]?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+\-]?\d+)?){4}'
+)
+_ADAPTIVE_SWEEP_PATTERN = re.compile(
+    rb"(?P<adaptive_sweep_head>FREQ \w+ AY ABS_ENTRY)(?: -?[0-9]\d*(?:\.\d+)?){2}"
+    rb"(?P<adaptive_sweep_third_value> -?[0-9]\d*(?:\.\d+)?) (?P<adaptive_sweep_last_value>-?[0-9]\d*(?:\.\d+)?)"
+)
+_LINEAR_SWEEP_PATTERN = re.compile(rb"(?P<linear_sweep_head>FREQ \w+ \w+ SWEEP)(?: -?[0-9]\d*(?:\.\d+)?){3}")
+
+# The permissions open() gives a new file. Temp files from mkstemp are only
+# readable by their owner so are given these before replacing the output
+# file. The umask can only be read by setting it, so this is done once here.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_NEW_FILE_MODE = 0o666 & ~_UMASK
+
+
+@lru_cache(maxsize=32)
+def _get_param_pattern(param_names: tuple[str, ...]) -> re.Pattern:
+    """Get the pattern matching the lines of the params in param_names.
+
+    The params are one alternation of their names so params that are not
+    being edited never match. This is cached as an optimiser edits the same
+    params for every file it generates.
+    """
+    param_names_alternation = b"|".join(re.escape(param_name.encode()) for param_name in param_names)
+    return re.compile(rb"VALVAR (?P<param_name>" + param_names_alternation + rb') LNG (?:\w+|"\w+"|\d+\.\d+) "Dim\. Param\."')
+
+
+# The keys each dict of edits must have.
+_GENERAL_METAL_KEYS_NEEDED = frozenset(("Rdc", "Rrf", "Xdc", "Ls"))
+_ADAPTIVE_SWEEP_KEYS_NEEDED = frozenset(("sweep_min", "sweep_max", "target_freqs"))
+_LINEAR_SWEEP_KEYS_NEEDED = frozenset(("sweep_min", "sweep_max", "step_size"))
+
+# What can be done when an output file already exists.
+_ON_EXISTS_OPTIONS = ("overwrite", "skip", "error")
+
+
+def _read_base_file(base_filename: str, base_file_path: str) -> bytes:
+    """Read the contents of the base Sonnet file."""
+    # if the basefile has no .son file extention add it.
+    if not base_filename.endswith(".son"):
+        base_filename = f"{base_filename}.son"
+
+    # add the path for the basefile
+    base_file = os.path.join(base_file_path, base_filename)
+
+    # check base_file exists
+    if not os.path.isfile(base_file):
+        raise FileNotFoundError(f"Unable to find file: {base_file}")
+
+    # The contents are cached against the file's modification time and size
+    # so a changed base file is read again.
+    base_file_stat = os.stat(base_file)
+    return _read_base_file_contents(os.path.abspath(base_file), base_file_stat.st_mtime_ns, base_file_stat.st_size)
+
+
+@lru_cache(maxsize=8)
+def _read_base_file_contents(base_file: str, mtime_ns: int, size: int) -> bytes:
+    """Read the contents of base_file. mtime_ns and size are only used as
+    part of the cache key."""
+    # The contents are kept as bytes. The editable parts of a Sonnet file
+    # are all ascii so they are found with bytes patterns and the rest of the
+    # file is copied to the output without ever being decoded.
+    with open(base_file, "rb") as f:
+        contents = f.read()
+
+    return contents
+
+
+def _make_output_dir(output_file_path: str) -> None:
+    """Check output_directory exists and if not try to create it. A blank
+    output_file_path is the current directory so is left as it is."""
+    if output_file_path:
+        os.makedirs(output_file_path, exist_ok=True)
+
+
+def _get_output_filename(output_filename: str, output_filename_prefix: str, output_filename_suffix: str) -> str:
+    """Get the output filename with its prefix, suffix and .son file
+    extention."""
+    # if .son file extention exists remove it. It is added next.
+    output_filename = output_filename.removesuffix(".son")
+
+    return f"{output_filename_prefix}{output_filename}{output_filename_suffix}.son"
+
+
+def _check_on_exists(on_exists: str) -> None:
+    """Check on_exists is one of the _ON_EXISTS_OPTIONS."""
+    if on_exists not in _ON_EXISTS_OPTIONS:
+        raise ValueError(f"Cannot use on_exists={on_exists}. Can only use {list(_ON_EXISTS_OPTIONS)}")
+
+
+def _should_write_output_file(final_file: str, on_exists: str) -> bool:
+    """Check if final_file should be written, following on_exists when it
+    already exists."""
+    if not os.path.isfile(final_file):
+        return True
+
+    match on_exists:
+        case "skip":
+            print(f"WARNING:\n\tFile {final_file} already exists. Nothing written, moving on.")
+            return False
+        case "error":
+            raise FileExistsError(f"File already exists: {final_file}")
+
+    return True
+
+
+def _write_edited_file(
+    contents: bytes,
+    final_file: str,
+    params_to_edit: Dict,
+    general_metals_to_edit: Dict,
+    adaptive_sweeps_to_edit: Dict,
+    linear_sweeps_to_edit: Dict,
+    output_buffer_size: int,
+) -> None:
+    """Write the base file contents to final_file with the edits made. See
+    generate_file_like for the form of each of the dicts of edits."""
+    # Check the dicts of edits have the keys they need. Any that dont are
+    # skipped.
+    valid_general_metals_to_edit = {}
+    for metal_name, vals in general_metals_to_edit.items():
+        if not vals.keys() >= _GENERAL_METAL_KEYS_NEEDED:
+            print(
+                f'The "{metal_name}" general metal to edit does not have the correct keys. Keys needed are {sorted(_GENERAL_METAL_KEYS_NEEDED)}. The keys present are {list(vals.keys())}.'
+            )
+            continue
+        valid_general_metals_to_edit[metal_name] = vals
+
+    if adaptive_sweeps_to_edit and not adaptive_sweeps_to_edit.keys() >= _ADAPTIVE_SWEEP_KEYS_NEEDED:
+        print(
+            f"The adaptive sweeps to edit does not have the correct keys. Keys needed are {sorted(_ADAPTIVE_SWEEP_KEYS_NEEDED)}. The keys present are {list(adaptive_sweeps_to_edit.keys())}."
+        )
+        adaptive_sweeps_to_edit = {}
+
+    if linear_sweeps_to_edit and not linear_sweeps_to_edit.keys() >= _LINEAR_SWEEP_KEYS_NEEDED:
+        print(
+            f"The linear sweeps to edit does not have the correct keys. Keys needed are {sorted(_LINEAR_SWEEP_KEYS_NEEDED)}. The keys present are {list(linear_sweeps_to_edit.keys())}."
+        )
+        linear_sweeps_to_edit = {}
+
+    # Only keep the params and general metals whose line appears in the file.
+    # A plain substring search is much cheaper than the regex search, which
+    # is skipped entirely for params and general metals not in the file.
+    params_in_file = {name: val for name, val in params_to_edit.items() if f"VALVAR {name} LNG ".encode() in contents}
+    general_metals_in_file = {name: vals for name, vals in valid_general_metals_to_edit.items() if f'MET "{name}" '.encode() in contents}
+
+    # The names of everything that was found and edited in the file.
+    found = set()
+
+    # Find every edit, searching only for the kinds of edits asked for. Each
+    # edit is kept as the (start, end) span of contents it replaces and its
+    # replacement. These are sorted into the order they appear in the file.
+    edits = []
+
+    if params_in_file:
+        for param in _get_param_pattern(tuple(params_in_file)).finditer(contents):
+            param_name = param.group("param_name").decode()
+            found.add(("param", param_name))
+            replacement = f'VALVAR {param_name} LNG {params_in_file[param_name]} "Dim. Param."'.encode()
+            edits.append((param.start(), param.end(), replacement))
+
+    if general_metals_in_file:
+        for general_metal in _GENERAL_METAL_PATTERN.finditer(contents):
+            metal_name = general_metal.group("general_metal_name").decode(errors="surrogateescape")
+            if metal_name not in general_metals_in_file:
+                continue
+            found.add(("general_metal", metal_name))
+            vals = general_metals_in_file[metal_name]
+
+            metal_head = general_metal.group("general_metal_head").decode()
+            replacement = f"{metal_head} {vals['Rdc']} {vals['Rrf']} {vals['Xdc']} {vals['Ls']}".encode()
+            edits.append((general_metal.start(), general_metal.end(), replacement))
+
+    if adaptive_sweeps_to_edit:
+        new_sweep_min = adaptive_sweeps_to_edit["sweep_min"]
+        new_sweep_max = adaptive_sweeps_to_edit["sweep_max"]
+        target_freqs = adaptive_sweeps_to_edit["target_freqs"]
+
+        for adaptive_sweep in _ADAPTIVE_SWEEP_PATTERN.finditer(contents):
+            found.add(("adaptive_sweep", None))
+
+            sweep_head = adaptive_sweep.group("adaptive_sweep_head").decode()
+            third_value = adaptive_sweep.group("adaptive_sweep_third_value").decode()
+            # target_freqs replaces the trailing digits of the last value.
+            last_value_start = adaptive_sweep.group("adaptive_sweep_last_value").decode().rstrip("0123456789")
+            replacement = f"{sweep_head} {new_sweep_min} {new_sweep_max}{third_value} {last_value_start}{target_freqs}".encode()
+            edits.append((adaptive_sweep.start(), adaptive_sweep.end(), replacement))
+
+    if linear_sweeps_to_edit:
+        new_sweep_min = linear_sweeps_to_edit["sweep_min"]
+        new_sweep_max = linear_sweeps_to_edit["sweep_max"]
+        step_size = linear_sweeps_to_edit["step_size"]
+
+        for linear_sweep in _LINEAR_SWEEP_PATTERN.finditer(contents):
+            found.add(("linear_sweep", None))
+
+            sweep_head = linear_sweep.group("linear_sweep_head").decode()
+            replacement = f"{sweep_head} {new_sweep_min} {new_sweep_max} {step_size}".encode()
+            edits.append((linear_sweep.start(), linear_sweep.end(), replacement))
+
+    edits.sort(key=lambda edit: edit[0])
+
+    # The warnings for everything not found are printed together so they are
+    # written in one go and stay together when files are written in threads.
+    warnings = []
+    for param_name in params_to_edit:
+        if ("param", param_name) not in found:
+            warnings.append(f"WARNING:\n\tParmeter {param_name} not found in file. Nothing changed, moving on.")
+
+    for metal_name in valid_general_metals_to_edit:
+        if ("general_metal", metal_name) not in found:
+            warnings.append(f"WARNING:\n\tGeneral metal {metal_name} not found in file. Nothing changed, moving on.")
+
+    if adaptive_sweeps_to_edit and ("adaptive_sweep", None) not in found:
+        warnings.append("WARNING:\n\tCan't find an adaptive sweep to alter. Nothing changed, moving on.")
+
+    if linear_sweeps_to_edit and ("linear_sweep", None) not in found:
+        warnings.append("WARNING:\n\tCan't find an linear sweep to alter. Nothing changed, moving on.")
+
+    if warnings:
+        print("\n".join(warnings))
+
+    # Write the unchanged contents between each edit and the edits
+    # themselves straight to the file rather than building a new string. The
+    # unchanged contents are written from a memoryview so are not copied.
+    # This is written to a temp file next to final_file which is then
+    # renamed over it, so final_file is never left half written. Each write
+    # gets its own temp file so writers of the same final_file can not mix.
+    temp_fd, temp_file = tempfile.mkstemp(suffix=".tmp", prefix=f"{os.path.basename(final_file)}.", dir=os.path.dirname(final_file) or ".")
+    try:
+        with open(temp_fd, "wb", buffering=output_buffer_size) as f, memoryview(contents) as contents_view:
+            prev_end = 0
+            for start, end, replacement in edits:
+                f.write(contents_view[prev_end:start])
+                f.write(replacement)
+                prev_end = end
+            f.write(contents_view[prev_end:])
+
+        os.chmod(temp_file, _NEW_FILE_MODE)
+        os.replace(temp_file, final_file)
+    except BaseException:
+        if os.path.isfile(temp_file):
+            os.remove(temp_file)
+        raise
 
 
 def generate_file_like(
@@ -14,6 +269,8 @@ def generate_file_like(
     general_metals_to_edit: Dict = {},
     adaptive_sweeps_to_edit: Dict = {},
     linear_sweeps_to_edit: Dict = {},
+    output_buffer_size: int = 1 << 20,
+    on_exists: Literal["overwrite", "skip", "error"] = "overwrite",
 ) -> None:
     """This generates a Sonnet file like the base file specified. This will
     take in a series of values or other elements to further modify the Sonnet
@@ -98,142 +355,141 @@ def generate_file_like(
         ...     "step_size" : 0.1,
         ... }
 
+    output_buffer_size : int
+        The size in bytes of the buffer used when writing the output file.
+        Default is 1 MiB.
+
+    on_exists : Literal["overwrite", "skip", "error"]
+        What to do if the output file already exists. "overwrite" replaces
+        its contents, "skip" leaves it as it is and "error" raises a
+        FileExistsError. Default is "overwrite".
+
     Warnings
     --------
-    If a file with this name already exists then its contents will be
-    overwritten!
+    By default if a file with this name already exists then its contents will
+    be overwritten!
     """
+    _check_on_exists(on_exists)
 
-    # if the basefile has no .son file extention add it.
-    if base_filename[-4:] != ".son":
-        base_filename = f"{base_filename}.son"
+    contents = _read_base_file(base_filename, base_file_path)
 
-    # add the path for the basefile
-    base_file = os.path.join(base_file_path, base_filename)
-
-    # check base_file exists
-    if not os.path.isfile(base_file):
-        raise FileNotFoundError(f"Unable to find file: {base_file}")
-
-    # check output_directory exists and if not try to create it.
-    if not os.path.isdir(output_file_path):
-        try:
-            os.mkdir(output_file_path)
-        except Exception as err:
-            raise err
-
-    # if .son file extention exists remove it. It is added next.
-    if output_filename[-4:] == ".son":
-        output_filename = output_filename[:-4]
-
-    output_filename = f"{output_filename_prefix}{output_filename}{output_filename_suffix}.son"
+    _make_output_dir(output_file_path)
 
+    output_filename = _get_output_filename(output_filename, output_filename_prefix, output_filename_suffix)
     final_file = os.path.join(output_file_path, output_filename)
 
-    with open(base_file) as f:
-        contents = f.read()
+    if not _should_write_output_file(final_file, on_exists):
+        return
 
-    # If params dict not empty then change vals
-    if params_to_edit:
-        for key, val in params_to_edit.items():
-            pattern = re.compile(rf'VALVAR {key} LNG (\w+|"\w+"|\d+\.\d+) "Dim\. Param\."')
-
-            if pattern.search(contents):
-                replacement = f'VALVAR {key} LNG {val} "Dim. Param."'
-                contents = pattern.sub(replacement, contents)
-            else:
-                print(f"WARNING:\n\tParmeter {key} not found in file. Nothing changed, moving on.")
-
-    # If general_metals dict not empty then change vals
-    if general_metals_to_edit:
-        keys_needed = ["Rdc", "Rrf", "Xdc", "Ls"]
-        for metal_name, vals in general_metals_to_edit.items():
-            # check that the correct keys are in the dict
-            if not all(key in vals for key in keys_needed):
-                print(
-                    f'The "{metal_name}" general metal to edit does not have the correct keys. Keys needed are {keys_needed}. The keys present are {list(vals.keys())}.'
-                )
-                continue
+    _write_edited_file(
+        contents,
+        final_file,
+        params_to_edit,
+        general_metals_to_edit,
+        adaptive_sweeps_to_edit,
+        linear_sweeps_to_edit,
+        output_buffer_size,
+    )
 
-            full_pattern = re.compile(r'MET "' + metal_name + r'" \d+ SUP( [+\-]?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+\-]?\d+)?){4}')
-            match = full_pattern.search(contents)
-            if match:
-                metal_match_string = match.group()
+    print(f"Written file to drive:\n\tname: {output_filename}\n\tpath: {output_file_path}")
+    return
 
-                Rdc = vals["Rdc"]
-                Rrf = vals["Rrf"]
-                Xdc = vals["Xdc"]
-                Ls = vals["Ls"]
 
-                values_pattern = re.compile(r"( [+\-]?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+\-]?\d+)?){4}")
-                values_to_put_in = f" {Rdc} {Rrf} {Xdc} {Ls}"
+def generate_files_like(
+    base_filename: str,
+    jobs: Sequence[Mapping],
+    base_file_path: str = "",
+    output_buffer_size: int = 1 << 20,
+    max_workers: int = 1,
+    on_exists: Literal["overwrite", "skip", "error"] = "overwrite",
+) -> None:
+    """This generates many Sonnet files like the base file specified. This
+    does the same as calling generate_file_like for each job but the base
+    file is only read once and each output directory is only checked once.
 
-                new_metal_string = values_pattern.sub(values_to_put_in, metal_match_string)
+    Parameters
+    ----------
+    base_filename : str
+        This is the name of the base file, this will assume a ".son" file
+        extention if this is not included in the base file name.
+
+    jobs : Sequence[Mapping]
+        A dict for each file to generate. Each one must have an
+        "output_filename" key and can have any of the "output_file_path",
+        "output_filename_prefix", "output_filename_suffix", "params_to_edit",
+        "general_metals_to_edit", "adaptive_sweeps_to_edit" and
+        "linear_sweeps_to_edit" keys. These take the same values as the
+        generate_file_like arguments of the same name. An example list of
+        jobs would take the form:
+        >>> jobs = [
+        ...     {"output_filename": "file_1", "params_to_edit": {"Length_var_1": 400}},
+        ...     {"output_filename": "file_2", "params_to_edit": {"Length_var_1": 450}},
+        ...     ...
+        ... ]
 
-                contents = full_pattern.sub(new_metal_string, contents)
-            else:
-                print(f"WARNING:\n\tGeneral metal {metal_name} not found in file. Nothing changed, moving on.")
+    KwArgs
+    ------
+    base_file_path : str
+        The directory of the base file. Default is a blank string.
 
-    # If sweeps dict not empty then change vals
-    if adaptive_sweeps_to_edit:
-        keys_needed = ["sweep_min", "sweep_max", "target_freqs"]
-        # check that the correct keys are in the dict and if so do replacement
-        if all(key in adaptive_sweeps_to_edit for key in keys_needed):
-            full_pattern = re.compile(r"FREQ \w+ AY ABS_ENTRY( (-)?[0-9]\d*(\.\d+)?){4}")
-            match = full_pattern.search(contents)
-            if match:
-                abs_sweep_match_string = match.group()
-
-                new_sweep_min = adaptive_sweeps_to_edit["sweep_min"]
-                new_sweep_max = adaptive_sweeps_to_edit["sweep_max"]
-                target_freqs = adaptive_sweeps_to_edit["target_freqs"]
-
-                sweep_min_max_pattern = re.compile(r"ABS_ENTRY( (-)?[0-9]\d*(\.\d+)?){2}")
-                sweep_min_max_replacement = f"ABS_ENTRY {new_sweep_min} {new_sweep_max}"
-                new_abs_sweep_string = sweep_min_max_pattern.sub(sweep_min_max_replacement, abs_sweep_match_string)
-
-                target_freqs_pattern = re.compile(r"(\d+)\D*$")
-                target_freqs_replacement = f"{target_freqs}"
-                new_abs_sweep_string = target_freqs_pattern.sub(target_freqs_replacement, new_abs_sweep_string)
-
-                contents = full_pattern.sub(new_abs_sweep_string, contents)
-            else:
-                print("WARNING:\n\tCan't find an adaptive sweep to alter. Nothing changed, moving on.")
-
-        else:
-            print(
-                f"The adaptive sweeps to edit does not have the correct keys. Keys needed are {keys_needed}. The keys present are {list(adaptive_sweeps_to_edit.keys())}."
-            )
+    output_buffer_size : int
+        The size in bytes of the buffer used when writing each output file.
+        Default is 1 MiB.
 
-    # If sweeps dict not empty then change vals
-    if linear_sweeps_to_edit:
-        keys_needed = ["sweep_min", "sweep_max", "step_size"]
-        # check that the correct keys are in the dict and if so do replacement
-        if all(key in linear_sweeps_to_edit for key in keys_needed):
-            full_pattern = re.compile(r"FREQ \w+ \w+ SWEEP( (-)?[0-9]\d*(\.\d+)?){3}")
-            match = full_pattern.search(contents)
-            if match:
-                linear_sweep_match_string = match.group()
-
-                new_sweep_min = linear_sweeps_to_edit["sweep_min"]
-                new_sweep_max = linear_sweeps_to_edit["sweep_max"]
-                step_size = linear_sweeps_to_edit["step_size"]
-
-                values_pattern = re.compile(r"( (-)?[0-9]\d*(\.\d+)?){3}")
-                values_to_put_in = f" {new_sweep_min} {new_sweep_max} {step_size}"
-                new_linear_sweep_string = values_pattern.sub(values_to_put_in, linear_sweep_match_string)
-
-                contents = full_pattern.sub(new_linear_sweep_string, contents)
-            else:
-                print("WARNING:\n\tCan't find an linear sweep to alter. Nothing changed, moving on.")
-
-        else:
-            print(
-                f"The linear sweeps to edit does not have the correct keys. Keys needed are {keys_needed}. The keys present are {list(linear_sweeps_to_edit.keys())}."
-            )
+    max_workers : int
+        The number of threads used to write the output files. Default is 1,
+        which writes them one after another. Writing the files is mostly
+        waiting on the disk so more threads can overlap that for large
+        batches. When more than 1 the order of the printed messages is not
+        fixed.
 
-    with open(final_file, "w") as f:
-        f.write(contents)
+    on_exists : Literal["overwrite", "skip", "error"]
+        What to do if the output file of a job already exists. "overwrite"
+        replaces its contents, "skip" leaves it as it is and "error" raises a
+        FileExistsError. Default is "overwrite".
 
-    print(f"Written file to drive:\n\tname: {output_filename}\n\tpath: {output_file_path}")
-    return
+    Warnings
+    --------
+    By default if a file with the name of any job already exists then its
+    contents will be overwritten!
+    """
+    _check_on_exists(on_exists)
+
+    contents = _read_base_file(base_filename, base_file_path)
+
+    # Check every output directory up front so the jobs can then be written
+    # in any order.
+    for output_file_path in {job.get("output_file_path", "") for job in jobs}:
+        _make_output_dir(output_file_path)
+
+    def write_job(job: Mapping) -> None:
+        output_file_path = job.get("output_file_path", "")
+        output_filename = _get_output_filename(
+            job["output_filename"],
+            job.get("output_filename_prefix", ""),
+            job.get("output_filename_suffix", ""),
+        )
+        final_file = os.path.join(output_file_path, output_filename)
+
+        if not _should_write_output_file(final_file, on_exists):
+            return
+
+        _write_edited_file(
+            contents,
+            final_file,
+            job.get("params_to_edit", {}),
+            job.get("general_metals_to_edit", {}),
+            job.get("adaptive_sweeps_to_edit", {}),
+            job.get("linear_sweeps_to_edit", {}),
+            output_buffer_size,
+        )
+
+        print(f"Written file to drive:\n\tname: {output_filename}\n\tpath: {output_file_path}")
+
+    if max_workers > 1:
+        # list() so any error from a job is raised here.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(write_job, jobs))
+    else:
+        for job in jobs:
+            write_job(job)
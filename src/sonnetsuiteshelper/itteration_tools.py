@@ -1,11 +1,45 @@
+import json
+import math
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Sequence
 
 import numpy as np
 import yaml
-from matplotlib import pyplot as plt
 
 from . import analysis_tools, file_generation
 
+# Use the LibYAML bindings to read yaml when pyyaml was built with them.
+try:
+    from yaml import CSafeLoader as _YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlSafeLoader
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+
+# The numeric values in a yaml cache written by older versions.
+_LEGACY_CACHE_FLOAT_KEYS = (
+    "desired_output_param_value",
+    "desired_output_param_value_tolerence_percent",
+    "next_variable_param_value",
+    "sonnet_mesh_size",
+)
+_LEGACY_CACHE_FLOAT_LIST_KEYS = ("variable_param_values", "desired_output_param_values")
+
+
+def _legacy_cache_float(value) -> float:
+    """Convert a value read from a yaml cache written by older versions to a
+    float.
+
+    Those caches wrote numpy scalars by their repr, e.g.
+    'np.float64(2000000000.0)', and yaml reads numbers such as 1e-05 with
+    no decimal point as strings.
+    """
+    if isinstance(value, str) and value.endswith(")"):
+        value = value[value.index("(") + 1 : -1]
+    return float(value)
+
 
 class SimpleSingleParamOptimiser:
     """Optimiser for Sonnet files.
@@ -66,8 +100,8 @@ class SimpleSingleParamOptimiser:
         eg. if trying to get resonant frequency of 2GHz +- 1%, then this
         argument will be 'desired_output_param_value_tolerence_percent = 0.01'.
 
-    desired_output_param_values : list
-        This is a list of the desired ouptut parameter values from the optimser.
+    desired_output_param_values : np.ndarray
+        This is an array of the desired ouptut parameter values from the optimser.
 
     loaded_cache : bool
         This is a bool that shows whether a cache file has been used to laod
@@ -85,10 +119,51 @@ class SimpleSingleParamOptimiser:
         The name of the parameter that should be varied by the optimiser
         to achieve the desired result.
 
-    variable_param_values : list
-        This is a list of the variable parameter values used in the optimser.
+    variable_param_values : np.ndarray
+        This is an array of the variable parameter values used in the optimser.
     """
 
+    __slots__ = (
+        "name",
+        "correlation",
+        "variable_param_name",
+        "desired_output_param",
+        "desired_output_param_value",
+        "desired_output_param_value_tolerence_percent",
+        "next_variable_param_value",
+        "sonnet_mesh_size",
+        "batch_1_son_filename",
+        "batch_1_son_file_path",
+        "batch_1_output_filename",
+        "batch_1_output_file_path",
+        "loaded_cache",
+        "_variable_param_array",
+        "_desired_output_param_array",
+        "_n",
+        "_optimisation_lower_bound",
+        "_optimisation_upper_bound",
+        "_last_result_reached_optimisation",
+        "_made_cache_file_path",
+        "_last_cached_state_json",
+        "_lin_fit_cache",
+    )
+
+    # batch_no, name, variable_param_name, variable_param_value
+    _OUTPUT_FILENAME_TEMPLATE = "batch_%d__%s_%s_%s.son"
+
+    # The most times the step is halved looking for a value not yet simulated.
+    _MAX_STEP_HALVINGS = 64
+
+    # How to get each desired_output_param that can be optimised from the
+    # SonnetCSVOutputFile of a batch.
+    _OUTPUT_PARAM_GETTERS = {
+        "QR": lambda son_csv: son_csv.get_Q_values()[0],
+        "QC": lambda son_csv: son_csv.get_Q_values()[1],
+        "QI": lambda son_csv: son_csv.get_Q_values()[2],
+        "f0": lambda son_csv: son_csv.get_resonant_freq(),
+        "three_dB_BW": lambda son_csv: son_csv.get_three_dB_BW(),
+    }
+
     def __init__(
         self,
         unique_name: str,
@@ -183,16 +258,20 @@ class SimpleSingleParamOptimiser:
         if correlation not in acceptable_correlation_strings:
             raise ValueError(f"Cannot correlate {correlation}. Can only use {acceptable_correlation_strings}")
 
-        if batch_1_son_filename[-4:] != ".son":
+        if not batch_1_son_filename.endswith(".son"):
             raise ValueError(f"batch_1_son_filename should be a sonnet file. This means it should contain a '.son' file extention.")
 
-        if batch_1_output_filename[-4:] != ".csv":
+        if not batch_1_output_filename.endswith(".csv"):
             raise ValueError(
                 f"batch_1_output_filename should be a csv output file from a simulation. This means it should contain a '.csv' file extention."
             )
         # General setup
         self.name = unique_name
 
+        # The cache file path is only made the first time results are cached.
+        self._made_cache_file_path = False
+        self._last_cached_state_json: str | None = None
+
         # Check for an existing cache file if ignore_loading_cache is False
         if not ignore_loading_cache:
             self.load_cached_results()
@@ -200,19 +279,20 @@ class SimpleSingleParamOptimiser:
             self.loaded_cache = False
 
         if self.loaded_cache:
+            self._set_optimisation_bounds()
             return
 
         self.correlation = +1 if correlation == "+" else -1
 
         # Variable param setup
         self.variable_param_name = varaible_param_name
-        self.variable_param_values: list[float] = []
 
         # Desired param setup
         self.desired_output_param = desired_output_param
         self.desired_output_param_value = desired_output_param_value
         self.desired_output_param_value_tolerence_percent = desired_output_param_value_tolerence_percent
-        self.desired_output_param_values: list[float] = []
+        self._set_results([], [])
+        self._set_optimisation_bounds()
 
         # File settings
         self.sonnet_mesh_size = sonnet_mesh_size
@@ -236,34 +316,26 @@ class SimpleSingleParamOptimiser:
         string += f"\n\tdesired_output_param_value: {self.desired_output_param_value}"
         return string
 
-    def _create_yaml_str(self) -> str:
-        """Create a yaml formated string containing all the relevant instance
-        variables."""
+    def _get_cache_state(self) -> dict:
+        """Get a dict containing all the relevant instance variables to be
+        cached."""
         state = dict(
             name=self.name,
             correlation=self.correlation,
             variable_param_name=self.variable_param_name,
-            variable_param_values=self.variable_param_values,
+            variable_param_values=self.variable_param_values.tolist(),
             desired_output_param=self.desired_output_param,
-            desired_output_param_value=self.desired_output_param_value,
-            desired_output_param_value_tolerence_percent=self.desired_output_param_value_tolerence_percent,
-            desired_output_param_values=self.desired_output_param_values,
-            next_variable_param_value=self.next_variable_param_value,
-            sonnet_mesh_size=self.sonnet_mesh_size,
+            desired_output_param_value=float(self.desired_output_param_value),
+            desired_output_param_value_tolerence_percent=float(self.desired_output_param_value_tolerence_percent),
+            desired_output_param_values=self.desired_output_param_values.tolist(),
+            next_variable_param_value=float(self.next_variable_param_value),
+            sonnet_mesh_size=float(self.sonnet_mesh_size),
             batch_1_son_filename=self.batch_1_son_filename,
             batch_1_son_file_path=self.batch_1_son_file_path,
             batch_1_output_filename=self.batch_1_output_filename,
             batch_1_output_file_path=self.batch_1_output_file_path,
         )
-
-        state_str = "---\n"
-        for key, val in state.items():
-            if isinstance(val, str):
-                state_str = state_str + f"{key}: '{val}'\n"
-            else:
-                state_str = state_str + f"{key}: {val}\n"
-
-        return state_str
+        return state
 
     def get_cache_filename_and_path(self) -> str:
         """Get the filename and file path for the optimiser cache file."""
@@ -276,50 +348,82 @@ class SimpleSingleParamOptimiser:
 
     def get_cache_filename(self) -> str:
         """Get the filename for the optimiser cache file."""
-        filename = f"SSPOC_{self.name}.yml"
+        filename = f"SSPOC_{self.name}.json"
         return filename
 
+    def get_legacy_cache_filename_and_path(self) -> str:
+        """Get the filename and file path for the yaml optimiser cache file
+        written by older versions."""
+        return os.path.join(self.get_cache_file_path(), f"SSPOC_{self.name}.yml")
+
     def cache_results(self) -> None:
-        """Cache the results of the optimiser so far into a yaml file.
+        """Cache the results of the optimiser so far into a json file.
 
         This results in the optimser not regernerating and reanalysing
         files.
         """
-        # check output_directory exists and if not try to create it.
-        if not os.path.isdir(self.get_cache_file_path()):
-            try:
-                os.mkdir(self.get_cache_file_path())
-            except Exception as err:
-                raise err
+        # Nothing has changed since the cache was last written.
+        cache_state_json = json.dumps(self._get_cache_state())
+        if cache_state_json == self._last_cached_state_json:
+            return
+
+        # make sure the cache directory exists the first time this is called.
+        if not self._made_cache_file_path:
+            os.makedirs(self.get_cache_file_path(), exist_ok=True)
+            self._made_cache_file_path = True
 
-        yaml_str = self._create_yaml_str()
-        with open(self.get_cache_filename_and_path(), "w+") as yaml_file:
-            yaml_file.write(yaml_str)
+        # The cache is written in one go to a temp file which then replaces
+        # the cache file, so a crash never leaves a half written cache.
+        cache_file = self.get_cache_filename_and_path()
+        temp_cache_file = f"{cache_file}.tmp"
+        with open(temp_cache_file, "w") as json_file:
+            json_file.write(cache_state_json)
+        os.replace(temp_cache_file, cache_file)
+        self._last_cached_state_json = cache_state_json
 
         return
 
     def load_cached_results(self) -> None:
         """Load cached results of the optimiser so far if a cache file
-        exists."""
+        exists.
 
+        This reads the json cache file. A yaml cache file from an older
+        version is only read if there is no json cache file or the yaml
+        file is newer.
+        """
         cache_file = self.get_cache_filename_and_path()
+        legacy_cache_file = self.get_legacy_cache_filename_and_path()
 
-        if not os.path.isfile(cache_file):
+        cache_file_exists = os.path.isfile(cache_file)
+        legacy_cache_file_exists = os.path.isfile(legacy_cache_file)
+
+        if not (cache_file_exists or legacy_cache_file_exists):
             self.loaded_cache = False
             return
 
+        use_legacy_cache_file = legacy_cache_file_exists and (
+            not cache_file_exists or os.stat(legacy_cache_file).st_mtime > os.stat(cache_file).st_mtime
+        )
+
         try:
-            with open(cache_file, "r") as stream:
-                cached_data = yaml.safe_load(stream)
+            if use_legacy_cache_file:
+                with open(legacy_cache_file, "r") as stream:
+                    cached_data = yaml.load(stream, Loader=_YamlSafeLoader)
+                for key in _LEGACY_CACHE_FLOAT_KEYS:
+                    cached_data[key] = _legacy_cache_float(cached_data[key])
+                for key in _LEGACY_CACHE_FLOAT_LIST_KEYS:
+                    cached_data[key] = [_legacy_cache_float(value) for value in cached_data[key]]
+            else:
+                with open(cache_file, "r") as stream:
+                    cached_data = json.load(stream)
 
             self.name = cached_data.get("name")
             self.correlation = cached_data.get("correlation")
             self.variable_param_name = cached_data.get("variable_param_name")
-            self.variable_param_values = cached_data.get("variable_param_values")
             self.desired_output_param = cached_data.get("desired_output_param")
             self.desired_output_param_value = cached_data.get("desired_output_param_value")
             self.desired_output_param_value_tolerence_percent = cached_data.get("desired_output_param_value_tolerence_percent")
-            self.desired_output_param_values = cached_data.get("desired_output_param_values")
+            self._set_results(cached_data.get("variable_param_values"), cached_data.get("desired_output_param_values"))
             self.next_variable_param_value = cached_data.get("next_variable_param_value")
             self.sonnet_mesh_size = cached_data.get("sonnet_mesh_size")
             self.batch_1_son_filename = cached_data.get("batch_1_son_filename")
@@ -336,17 +440,20 @@ class SimpleSingleParamOptimiser:
 
     def get_current_batch_no(self) -> int:
         """Get the current batch number."""
-        current_batch_no = len(self.variable_param_values)
-        return current_batch_no
+        return self._n
 
     def get_next_batch_no(self) -> int:
         """Get the current batch number."""
-        next_batch_number = self.get_current_batch_no() + 1
-        return next_batch_number
+        return self._n + 1
 
     def get_next_output_filename(self) -> str:
         """Get the output filename for the next batch's generated file."""
-        output_filename = f"batch_{self.get_next_batch_no()}__{self.name}_{self.variable_param_name}_{self.next_variable_param_value}.son"
+        output_filename = self._OUTPUT_FILENAME_TEMPLATE % (
+            self._n + 1,
+            self.name,
+            self.variable_param_name,
+            self.next_variable_param_value,
+        )
         return output_filename
 
     def get_next_output_file_path(self) -> str:
@@ -358,7 +465,7 @@ class SimpleSingleParamOptimiser:
         """Get the filename of the output file from the last batch that has
         been simulated in sonnet."""
         # Strip the .son file extention and add csv extention
-        analysed_filename = self.get_next_output_filename()[:-4] + ".csv"
+        analysed_filename = self.get_next_output_filename().removesuffix(".son") + ".csv"
         return analysed_filename
 
     def get_last_analysis_file_path(self) -> str:
@@ -371,7 +478,7 @@ class SimpleSingleParamOptimiser:
         """Get the filename of the optimised file."""
         # Strip the .son file extention and add csv extention
         if self.last_result_reached_optimisation():
-            optimised_filename = self.get_last_output_filename()[:-4] + ".csv"
+            optimised_filename = self.get_last_output_filename().removesuffix(".son") + ".csv"
             return optimised_filename
         else:
             raise (LookupError("Could not get optimised filename. Optimiser has not yet found optimised values."))
@@ -389,8 +496,11 @@ class SimpleSingleParamOptimiser:
         if self.get_current_batch_no() == 1:
             output_filename = self.batch_1_son_filename
         else:
-            output_filename = (
-                f"batch_{self.get_current_batch_no()}__{self.name}_{self.variable_param_name}_{self.variable_param_values[-1]}.son"
+            output_filename = self._OUTPUT_FILENAME_TEMPLATE % (
+                self._n,
+                self.name,
+                self.variable_param_name,
+                self._variable_param_array[self._n - 1],
             )
         return output_filename
 
@@ -404,43 +514,83 @@ class SimpleSingleParamOptimiser:
 
     def get_last_desired_output_param_value(self) -> float:
         """Get the last desired output param value from the last analysis."""
-        return self.desired_output_param_values[-1]
+        return self._desired_output_param_array[self._n - 1]
 
     def get_last_variable_param_value(self) -> float:
         """Get the last variable param value from the last analysis."""
-        return self.variable_param_values[-1]
+        return self._variable_param_array[self._n - 1]
+
+    @property
+    def variable_param_values(self) -> np.ndarray:
+        """The variable parameter values used for each batch so far."""
+        return self._variable_param_array[: self._n]
+
+    @property
+    def desired_output_param_values(self) -> np.ndarray:
+        """The desired output parameter values from each batch so far."""
+        return self._desired_output_param_array[: self._n]
+
+    def _set_results(self, variable_param_values, desired_output_param_values) -> None:
+        """Set the results of the optimiser so far.
+
+        These are kept at the start of two arrays with room left over so
+        results can be appended without reallocating every batch.
+        """
+        no_results = len(variable_param_values)
+        capacity = max(64, 2 * no_results)
+
+        variable_param_array = np.empty(capacity, dtype=np.float64)
+        desired_output_param_array = np.empty(capacity, dtype=np.float64)
+        variable_param_array[:no_results] = variable_param_values
+        desired_output_param_array[:no_results] = desired_output_param_values
+
+        self._variable_param_array = variable_param_array
+        self._desired_output_param_array = desired_output_param_array
+        self._n = no_results
+        self._lin_fit_cache: tuple[int, float, float] | None = None
 
     def append_new_results_to_self(self, output_value: float) -> None:
         """Append the analysed results to self."""
-        self.desired_output_param_values.append(output_value)
-        self.variable_param_values.append(self.next_variable_param_value)
+        # Double the size of the arrays when they are full.
+        if self._n == len(self._variable_param_array):
+            self._set_results(self.variable_param_values, self.desired_output_param_values)
+
+        self._variable_param_array[self._n] = self.next_variable_param_value
+        self._desired_output_param_array[self._n] = output_value
+        self._n += 1
+        self._last_result_reached_optimisation = self._optimisation_lower_bound < output_value < self._optimisation_upper_bound
         return
 
+    def _set_optimisation_bounds(self) -> None:
+        """Work out the bounds the desired_output_param_value has to be within
+        to be optimised and whether the last result is within them."""
+        des = self.desired_output_param_value
+        tol = self.desired_output_param_value_tolerence_percent
+        self._optimisation_lower_bound = des * (1 - tol)
+        self._optimisation_upper_bound = des * (1 + tol)
+
+        if self._n:
+            last = self.get_last_desired_output_param_value()
+            self._last_result_reached_optimisation = self._optimisation_lower_bound < last < self._optimisation_upper_bound
+        else:
+            self._last_result_reached_optimisation = False
+
     def last_result_reached_optimisation(self) -> bool:
         """Check of the last desired_output_param_value is within the tolerance
         of the desired_output_param_value.
 
-        If des*(1+tol) <= (last output vlaue) <= des*(1+tol) -> True
+        If des*(1-tol) < (last output vlaue) < des*(1+tol) -> True
         else False.
-        """
-        last = self.get_last_desired_output_param_value()
-        des = self.desired_output_param_value
-        tol = self.desired_output_param_value_tolerence_percent
-        outside = False
-        if last <= des * (1 - tol):
-            outside = True
-
-        if last >= des * (1 + tol):
-            outside = True
 
-        if outside:
-            return False
-        else:
-            return True
+        This is worked out once when each result is added.
+        """
+        return self._last_result_reached_optimisation
 
     def round_to_sonnet_mesh_size(self, value) -> float:
         """Round the input value to the nearest sonnet_mesh_size step."""
-        rounded_result = np.round(float(value) / self.sonnet_mesh_size) * self.sonnet_mesh_size
+        # builtin round rounds halves to even the same as np.round but
+        # without going through numpy for a single value.
+        rounded_result = float(round(float(value) / self.sonnet_mesh_size) * self.sonnet_mesh_size)
         return rounded_result
 
     def get_next_variable_param_value(self) -> float:
@@ -450,9 +600,14 @@ class SimpleSingleParamOptimiser:
         # If less than or 3 batches run then use a simple scale to generate next
         if self.get_current_batch_no() <= 3:
             next_variable_param_value = self.get_next_variable_param_value_from_percent_scale()
+            next_variable_param_value = self.shrink_step_to_unsimulated_value(next_variable_param_value)
+            # If only the last value is left then change the value by the sonnet_mesh_size.
+            if next_variable_param_value == self.get_last_variable_param_value():
+                next_variable_param_value = self.change_variable_param_value_by_mesh_step()
             return next_variable_param_value
 
         next_variable_param_value = self.get_next_variable_param_value_from_lin_fit()
+        next_variable_param_value = self.shrink_step_to_unsimulated_value(next_variable_param_value)
 
         # If the next is the same as the last then try to percentage scale rather than lin fit.
         if next_variable_param_value == self.get_last_variable_param_value():
@@ -463,6 +618,33 @@ class SimpleSingleParamOptimiser:
 
         return next_variable_param_value
 
+    def shrink_step_to_unsimulated_value(self, next_variable_param_value: float) -> float:
+        """Halve the step from the last variable_param_value to the given next
+        value until it lands on a value that has not already been simulated.
+
+        Simulating a value again gives the same result so this avoids
+        wasting a batch when the optimiser overshoots back and forth. If
+        the step shrinks to nothing the last variable_param_value is
+        returned.
+        """
+        last_variable_param_value = self.get_last_variable_param_value()
+        rounded_last_variable_param_value = self.round_to_sonnet_mesh_size(last_variable_param_value)
+        step = next_variable_param_value - last_variable_param_value
+
+        # A set so each check does not scan every simulated value.
+        simulated_values = set(self.variable_param_values.tolist())
+        # The number of halvings is capped as a last value that is not on the
+        # mesh grid may never be rounded back to.
+        for _ in range(self._MAX_STEP_HALVINGS):
+            if next_variable_param_value not in simulated_values:
+                return next_variable_param_value
+            step /= 2
+            next_variable_param_value = self.round_to_sonnet_mesh_size(last_variable_param_value + step)
+            if next_variable_param_value == rounded_last_variable_param_value:
+                break
+
+        return last_variable_param_value
+
     def change_variable_param_value_by_mesh_step(self) -> float:
         """Changes the curent variable_param_value by the sonnet file mesh
         size.
@@ -470,10 +652,9 @@ class SimpleSingleParamOptimiser:
         This follows similar logic to the percent scale but only
         increases or decreases the value by the sonnet_mesh_size.
         """
-        if self.get_last_desired_output_param_value() > self.desired_output_param_value:
-            new_value = self.get_last_variable_param_value() + (self.correlation * self.sonnet_mesh_size)
-        else:
-            new_value = self.get_last_variable_param_value() - (self.correlation * self.sonnet_mesh_size)
+        # Step towards the desired value, down if the last output was above it.
+        direction = math.copysign(1.0, self.desired_output_param_value - self.get_last_desired_output_param_value())
+        new_value = self.get_last_variable_param_value() + (self.correlation * self.sonnet_mesh_size * direction)
 
         return new_value
 
@@ -486,14 +667,13 @@ class SimpleSingleParamOptimiser:
         This result is then rounded to the nearest sonnet mesh grid
         point.
         """
-        delta_from_desired = abs(self.get_last_desired_output_param_value() - self.desired_output_param_value)
+        # The sign of the delta gives the direction to step in so no branch is
+        # needed to pick between adding and subtracting.
+        delta_from_desired = self.desired_output_param_value - self.get_last_desired_output_param_value()
         adjust_strength = 0.002
         delta_in_variable_param = adjust_strength * delta_from_desired
 
-        if self.get_last_desired_output_param_value() > self.desired_output_param_value:
-            new_value = self.get_last_variable_param_value() - (self.correlation * delta_in_variable_param)
-        else:
-            new_value = self.get_last_variable_param_value() + (self.correlation * delta_in_variable_param)
+        new_value = self.get_last_variable_param_value() + (self.correlation * delta_in_variable_param)
 
         return self.round_to_sonnet_mesh_size(new_value)
 
@@ -505,11 +685,16 @@ class SimpleSingleParamOptimiser:
         This result is then rounded to the nearest sonnet mesh grid
         point.
         """
-        x_data = np.array(self.variable_param_values)
-        y_data = np.array(self.desired_output_param_values)
-        poly_fit = np.polyfit(y_data, x_data, deg=1)
-        poly_func = np.poly1d(poly_fit)
-        new_value = poly_func(self.desired_output_param_value)
+        # The fit only changes when results are added so it is reused by
+        # generate_next_batch and plot_optimisation for the same batch.
+        if self._lin_fit_cache is None or self._lin_fit_cache[0] != self._n:
+            x_data = self.variable_param_values
+            y_data = self.desired_output_param_values
+            slope, intercept = np.polyfit(y_data, x_data, deg=1)
+            self._lin_fit_cache = (self._n, slope, intercept)
+
+        _, slope, intercept = self._lin_fit_cache
+        new_value = slope * self.desired_output_param_value + intercept
 
         return self.round_to_sonnet_mesh_size(new_value)
 
@@ -534,18 +719,21 @@ class SimpleSingleParamOptimiser:
             "{batch_no}_{name}__{varaible_param_name}_{variable_param_value}.son"
         """
         if self.last_result_reached_optimisation():
-            print(f"Optimiser {self.name} Reached desired QR")
-            print(f"\tBatch_number = {self.get_current_batch_no()}")
-            print(f"\t{self.desired_output_param} = {self.get_last_desired_output_param_value()}")
-            print(f"\t{self.variable_param_name} = {self.get_last_variable_param_value()}")
-
-        if (not ignore_automatic_stop) and self.last_result_reached_optimisation():
-            return
+            print(
+                f"Optimiser {self.name} Reached desired {self.desired_output_param}\n"
+                f"\tBatch_number = {self.get_current_batch_no()}\n"
+                f"\t{self.desired_output_param} = {self.get_last_desired_output_param_value()}\n"
+                f"\t{self.variable_param_name} = {self.get_last_variable_param_value()}"
+            )
+            if not ignore_automatic_stop:
+                return
 
+        # This is a float so the file name generated here matches the one
+        # rebuilt later from variable_param_values.
         if override_variable_param_value is None:
-            variable_param_value = self.get_next_variable_param_value()
+            variable_param_value = float(self.get_next_variable_param_value())
         else:
-            variable_param_value = override_variable_param_value
+            variable_param_value = float(override_variable_param_value)
 
         self.next_variable_param_value = variable_param_value
 
@@ -570,6 +758,11 @@ class SimpleSingleParamOptimiser:
 
     def analyze_batch(self) -> None:
         """Analyze the current batch of simulations that have been run."""
+        get_output_value = self._OUTPUT_PARAM_GETTERS.get(self.desired_output_param)
+        if get_output_value is None:
+            print("ERROR")
+            raise (ValueError(f"Error, cannot optimise for {self.desired_output_param}"))
+
         if self.get_current_batch_no() == 0:
             # special case for first batch
             son_csv = analysis_tools.SonnetCSVOutputFile(self.batch_1_output_filename, file_path=self.batch_1_output_file_path)
@@ -579,40 +772,27 @@ class SimpleSingleParamOptimiser:
 
             son_csv = analysis_tools.SonnetCSVOutputFile(filename, file_path=file_path)
 
-        f0 = son_csv.get_resonant_freq()
-        QR, QC, QI = son_csv.get_Q_values()
-        three_dB_BW = son_csv.get_three_dB_BW()
-
-        match self.desired_output_param:
-            case "QR":
-                self.append_new_results_to_self(QR)
-            case "QC":
-                self.append_new_results_to_self(QC)
-            case "QI":
-                self.append_new_results_to_self(QI)
-            case "f0":
-                self.append_new_results_to_self(f0)
-            case "three_dB_BW":
-                self.append_new_results_to_self(three_dB_BW)
-            case _:
-                print("ERROR")
-                raise (ValueError(f"Error, cannot optimise for {self.desired_output_param}"))
+        # Only work out the value being optimised, the Q values need a fit to
+        # the resonance which is slower than finding f0 or the bandwidth.
+        output_value = get_output_value(son_csv)
 
+        self.append_new_results_to_self(output_value)
         return
 
     def plot_optimisation(
         self,
-        fig_ax: plt.Axes | None = None,
+        fig_ax: "Axes | None" = None,
         plot_fit_function: bool = True,
         plot_next_batch_variable_value: bool = True,
         set_axis_labels: bool = True,
     ) -> None:
         """Plot the current results of the optimiser."""
+        from matplotlib import pyplot as plt
 
-        x_data = np.array(self.variable_param_values)
+        x_data = self.variable_param_values
         x_label = self.variable_param_name
 
-        y_data = np.array(self.desired_output_param_values)
+        y_data = self.desired_output_param_values
         y_label = self.desired_output_param
 
         face_color_for_optimised = "#b4f7ab"
@@ -620,38 +800,39 @@ class SimpleSingleParamOptimiser:
 
         if fig_ax is None:
             title = f"{self.name} - {self.desired_output_param} vs {self.variable_param_name}"
+            # plt.figure returns the existing figure with this title so it is
+            # cleared and reused rather than stacking new axes on each call.
             fig = plt.figure(title)
-            rows = 1
-            cols = 1
-            grid = plt.GridSpec(rows, cols)
-            ax = plt.subplot(grid[0, 0])
+            fig.clear()
+            ax = fig.add_subplot(1, 1, 1)
         else:
             ax = fig_ax
 
+        # cos(phi +- 2pi/3) = -cos(phi)/2 -+ sin(phi)*sqrt(3)/2 so only one cos
+        # and one sin are needed for the three colour channels.
         phi = np.linspace(0, np.pi, len(x_data))
-        rgb_cycle = (
-            np.stack(
-                (
-                    np.cos(phi),
-                    np.cos(phi + 2 * np.pi / 3),
-                    np.cos(phi - 2 * np.pi / 3),
-                )
-            ).T
-            + 1
-        ) * 0.5
-
-        for i, (x, y) in enumerate(zip(x_data, y_data)):
-            ax.scatter(x, y, s=5, color=rgb_cycle[i])
+        cos_phi = np.cos(phi)
+        sin_phi = np.sin(phi)
+        rgb_cycle = np.empty((len(phi), 3))
+        rgb_cycle[:, 0] = cos_phi
+        rgb_cycle[:, 1] = -0.5 * cos_phi - (np.sqrt(3) / 2) * sin_phi
+        rgb_cycle[:, 2] = -0.5 * cos_phi + (np.sqrt(3) / 2) * sin_phi
+        rgb_cycle += 1
+        rgb_cycle *= 0.5
+
+        # All the points in one scatter, only the batch number labels need
+        # adding one at a time.
+        ax.scatter(x_data, y_data, s=5, c=rgb_cycle)
+        for i, (x, y) in enumerate(zip(x_data.tolist(), y_data.tolist())):
             ax.annotate(f"{i+1}", (x, y))
 
         ax.axhline(y=self.desired_output_param_value)
 
         if plot_fit_function and self.get_current_batch_no() > 3:
-            poly_fit = np.polyfit(x_data, y_data, deg=1)
-            poly_func = np.poly1d(poly_fit)
-            x_ax = np.linspace(min(x_data) * 0.999, max(x_data) * 1.001, 100)
+            slope, intercept = np.polyfit(x_data, y_data, deg=1)
+            x_ax = np.linspace(x_data.min() * 0.999, x_data.max() * 1.001, 100)
 
-            ax.plot(x_ax, poly_func(x_ax), label="fit")
+            ax.plot(x_ax, slope * x_ax + intercept, label="fit")
 
         if plot_next_batch_variable_value and (not self.last_result_reached_optimisation()):
             next_variable_param_value = self.get_next_variable_param_value()
@@ -687,3 +868,41 @@ class SimpleSingleParamOptimiser:
             fig.show()
 
         return
+
+
+def step_optimisers(optimisers: Sequence[SimpleSingleParamOptimiser], max_workers: int = 1) -> None:
+    """Analyze the last batch of each optimiser and then generate its next
+    batch. This is the same as calling analyze_batch and then
+    generate_next_batch on each optimiser in turn. Optimisers that have
+    already reached optimisation are skipped as they have no next batch
+    to analyze.
+
+    Parameters
+    ----------
+    optimisers : Sequence[SimpleSingleParamOptimiser]
+        The optimisers to step. Each should have a unique name so they
+        each have their own batch files and cache file.
+
+    KwArgs
+    ------
+    max_workers : int
+        The number of threads used to step the optimisers. Default is 1,
+        which steps them one after another. The optimisers are independent
+        so more threads can overlap reading, analysing and writing their
+        files. When more than 1 the order of the printed messages is not
+        fixed.
+    """
+
+    def step(optimiser: SimpleSingleParamOptimiser) -> None:
+        if optimiser.last_result_reached_optimisation():
+            return
+        optimiser.analyze_batch()
+        optimiser.generate_next_batch()
+
+    if max_workers > 1:
+        # list() so any error from an optimiser is raised here.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(step, optimisers))
+    else:
+        for optimiser in optimisers:
+            step(optimiser)
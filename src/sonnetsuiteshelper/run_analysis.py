@@ -1,8 +1,48 @@
 import os
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from os.path import isfile
 from sys import stdout
-from typing import Dict
+from typing import Callable, Dict, Sequence
+
+
+@lru_cache(maxsize=8)
+def _get_em_exec(sonnet_install_loc: str) -> str:
+    """Get the path of the em executable in a sonnet install.
+
+    The install does not change between analyses so this is only checked
+    once per install. A missing executable raises and so is not cached.
+    """
+    em_exec = os.path.join(sonnet_install_loc, r"bin\em")
+
+    # Check the em executable exists for the provided sonnet install loc.
+    if not os.path.isfile(em_exec):
+        raise FileNotFoundError("Could not find em executable in sonnet install path.")
+
+    return em_exec
+
+
+@lru_cache(maxsize=1)
+def _get_emclient_exec() -> str:
+    """Get the path of the emclient executable.
+
+    This is the emclient on the PATH if there is one, otherwise the default
+    Sonnet 17.56 install location. It is only looked up once.
+    """
+    return shutil.which("emclient") or r"C:\Program Files\Sonnet Software\17.56\bin\emclient"
+
+
+def _run_many(func: Callable[[str], bytes], project_names: Sequence[str], max_workers: int) -> list:
+    """Call func on each project name, with up to max_workers running at the
+    same time, and return the outputs in the same order as project_names."""
+    if max_workers > 1:
+        # list() so any error from an analysis is raised here.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(func, project_names))
+
+    return [func(project_name) for project_name in project_names]
 
 
 def analyze_local(
@@ -56,6 +96,12 @@ def analyze_local(
     param_file: str = "",
         Default is blank str
 
+    Returns
+    -------
+    cmd_output : bytes
+        The output from the em analysis. When display_analysis_info_live is
+        True this is the same output that was displayed live.
+
     See Also
     --------
     analyze_remote : remote server analysis.
@@ -67,49 +113,60 @@ def analyze_local(
         https://www.sonnetsoftware.com/support/help-18/users_guide/Sonnet%20User's%20Guide.html?EmCommandLineforBatch.html
     """
 
-    em_exec = os.path.join(sonnet_install_loc, r"bin\em")
-
-    # Check the em executable exists for the provided sonnet install loc.
-    if not os.path.isfile(em_exec):
-        raise FileNotFoundError("Could not find em executable in sonnet install path.")
+    em_exec = _get_em_exec(sonnet_install_loc)
 
     # Check if the project name ends .son if not add it.
-    if project_name[:-4] != ".son":
+    if not project_name.endswith(".son"):
         project_name += ".son"
 
     # Check the project file exists.
     if not os.path.isfile(project_name):
         raise (FileNotFoundError)
 
-    run_cmd = f"{em_exec} {project_name}"
+    # The command is passed as a list of arguments so it is run directly
+    # rather than through a shell.
+    run_cmd = [em_exec, project_name]
 
     if display_analysis_info_live:
-        run_cmd += " -v"
+        run_cmd.append("-v")
 
     if lossles:
-        run_cmd += " -Lossles"
+        run_cmd.append("-Lossles")
 
     if abs_cache_none:
-        run_cmd += " -AbsCacheNone"
+        run_cmd.append("-AbsCacheNone")
 
     if abs_cache_stop_restart:
-        run_cmd += " -AbsCacheStopRestart"
+        run_cmd.append("-AbsCacheStopRestart")
 
     if abs_cache_multi_sweep:
-        run_cmd += " -AbsCacheMultiSweep"
+        run_cmd.append("-AbsCacheMultiSweep")
 
     if abs_no_discrete:
-        run_cmd += " -AbsNoDiscrete"
+        run_cmd.append("-AbsNoDiscrete")
 
     if sub_freq_Hz:
-        run_cmd += f" -SubFreqHz[{sub_freq_Hz}]"
+        run_cmd.append(f"-SubFreqHz[{sub_freq_Hz}]")
 
     if param_file:
-        run_cmd += f" -ParamFile {param_file}"
-
-    cmd_output = subprocess.Popen(run_cmd, shell=True, stdout=subprocess.PIPE.stdout.read())
-
-    return
+        run_cmd += ["-ParamFile", param_file]
+
+    if not display_analysis_info_live:
+        # run the command that has been built up and capture output
+        cmd_output = subprocess.run(run_cmd, stdout=subprocess.PIPE).stdout
+        return cmd_output
+
+    # Print each line of the analysis info as soon as em outputs it while
+    # still capturing all of the output.
+    output_lines = []
+    with subprocess.Popen(run_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as process:
+        for line in process.stdout:
+            stdout.write(line.decode(errors="replace"))
+            stdout.flush()
+            output_lines.append(line)
+
+    cmd_output = b"".join(output_lines)
+    return cmd_output
 
 
 def analyze_remote(project_name: str, remote_host: str, remote_port: str, param_file: str = ""):
@@ -132,44 +189,111 @@ def analyze_remote(project_name: str, remote_host: str, remote_port: str, param_
     param_file: str
         This is a parameter file name for a project. This should include the
         path for the file and the file extention.
-    """
-    run_cmd = ""
 
-    # get emclient_path in argument
-    emclient_path = r'"C:\Program Files\Sonnet Software\17.56\bin\emclient"'
-
-    shell = "TODO"
-
-    if shell == "ps":
-        run_cmd += "& "
-
-    run_cmd = emclient_path
-
-    # If this should be run remote try to add the remote to the run command
-    # remote = True
-    # if remote:
-    #     keys_needed = ["host", "port"]
-    #     if all(key in remote for key in keys_needed):
-    #         run_cmd += f' -Server {remote["host"]}:{remote["port"]}'
-    #     else:
-    #         raise (
-    #             KeyError(
-    #                 f"remote parameter does not contain the keys needed.\nThe keys needed are {keys_needed}.\nCurrent keys are {list(remote.keys())}"
-    #             )
-    #         )
+    Returns
+    -------
+    cmd_output : bytes
+        The output from the emclient analysis.
+    """
+    emclient_path = _get_emclient_exec()
 
-    run_cmd += f" -ProjectName {project_name}"
+    # The command is passed as a list of arguments so it is run directly
+    # rather than through a shell and the path needs no quoting.
+    run_cmd = [emclient_path, "-Server", f"{remote_host}:{remote_port}", "-ProjectName", project_name]
 
     # If this should be run with a parameter file try to add it to the run command
     if param_file:
         if os.path.isfile(param_file):
-            run_cmd += f" -ParamFile {param_file}"
+            run_cmd += ["-ParamFile", param_file]
         else:
             raise FileNotFoundError("Could not find the parameter file in given directory")
 
-    run_cmd += r" -Analyze"
+    run_cmd.append("-Analyze")
 
     # run the command that has been built up and capture output
-    cmd_output = subprocess.Popen(run_cmd, shell=True, stdout=subprocess.PIPE).stdout.read()
+    cmd_output = subprocess.run(run_cmd, stdout=subprocess.PIPE).stdout
 
     return cmd_output
+
+
+def analyze_many(project_names: Sequence[str], sonnet_install_loc: str, max_workers: int = 1, **analyze_local_kwargs) -> list:
+    """Send many files to the local Sonnet Suites Solver. This does the same
+    as calling analyze_local for each project name with the same options.
+
+    Parameters
+    ----------
+    project_names : Sequence[str]
+        The names of the sonnet files to be analyzed. Any that do not include
+        the ".son" file extention will have it added.
+
+    sonnet_install_loc : str
+        This the directory of the sonnet install. See analyze_local.
+
+    KwArgs
+    ------
+    max_workers : int
+        The number of analyses to run at the same time. Default is 1, which
+        runs them one after another. Each analysis is its own em process so
+        more workers can run them in parallel, up to what the machine and
+        the Sonnet licence allow. When more than 1 any live analysis info
+        printed from different projects will be mixed together.
+
+    **analyze_local_kwargs
+        Any other analyze_local keyword arguments, e.g. lossles=True. These
+        are used for every project.
+
+    Returns
+    -------
+    cmd_outputs : list
+        The output from each analysis in the same order as project_names.
+
+    See Also
+    --------
+    analyze_local : analysis of a single file.
+    """
+
+    analyze_project = partial(analyze_local, sonnet_install_loc=sonnet_install_loc, **analyze_local_kwargs)
+    return _run_many(analyze_project, project_names, max_workers)
+
+
+def analyze_many_remote(
+    project_names: Sequence[str], remote_host: str, remote_port: str, param_file: str = "", max_workers: int = 1
+) -> list:
+    """Send many files to a remote emsolver server for analysis. This does
+    the same as calling analyze_remote for each project name.
+
+    Parameters
+    ----------
+    project_names : Sequence[str]
+        The names of the sonnet files to be analyzed.
+
+    remote_host : str
+        This is the host name for the remote solver. e.g. "10.1.10.30"
+
+    remote_port : str
+        This is the port to be used to connect to the remote solver. e.g. "56150"
+
+    KwArgs
+    ------
+    param_file: str
+        This is a parameter file name used for every project. This should
+        include the path for the file and the file extention.
+
+    max_workers : int
+        The number of projects to submit at the same time. Default is 1,
+        which submits them one after another. Each submission is its own
+        emclient process which waits on the server, so more workers keep
+        the server busy with several projects at once.
+
+    Returns
+    -------
+    cmd_outputs : list
+        The output from each analysis in the same order as project_names.
+
+    See Also
+    --------
+    analyze_remote : remote analysis of a single file.
+    """
+
+    analyze_project = partial(analyze_remote, remote_host=remote_host, remote_port=remote_port, param_file=param_file)
+    return _run_many(analyze_project, project_names, max_workers)
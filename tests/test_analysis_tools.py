@@ -0,0 +1,146 @@
+import sys
+
+import numpy as np
+import pytest
+
+from sonnetsuiteshelper.analysis_tools import SonnetCSVOutputFile
+
+"""
+tests - analysis_tools.py.
+    SonnetCSVOutputFile testing.
+        [X] - read file_data and S_params with pyarrow and np.loadtxt
+        [X] - S mag and S mag dB
+        [X] - 3dB BW against the analytic value
+        [X] - Q values of a resonator and reusing the fit
+        [X] - resonant freq on an unevenly spaced freq grid
+"""
+
+# A resonator at 2GHz with a 1e4Hz freq step.
+f0 = 2.0e9
+qr = 2.0e4
+qc = 3.0e4
+freqs = np.arange(f0 - 2e7, f0 + 2e7 + 1, 1e4)
+
+
+def resonator_S_params(freqs, f0: float, qr: float, qc: float) -> np.ndarray:
+    """The S params of a resonator, with S21 from the same model as
+    S21_mag_fit, S12=S21 and S11=S22=1-S21."""
+    S21 = 1 - (qr / qc) / (1 + 2j * qr * (freqs / f0 - 1))
+    S_params = np.empty((len(freqs), 2, 2), dtype=np.complex128)
+    S_params[:, 0, 0] = S_params[:, 1, 1] = 1 - S21
+    S_params[:, 0, 1] = S_params[:, 1, 0] = S21
+    return S_params
+
+
+def write_sonnet_csv(csv_file, freqs, S_params) -> None:
+    """Write a sonnet csv output file with S_params of shape (freqs, port1,
+    port2)."""
+    with open(csv_file, "w") as csv:
+        csv.write('"Sonnet Data File"\nS-Param,Real-Imag,R 50.00000\n')
+        csv.write("FREQUENCY (GHz),RE[S11],IM[S11],RE[S12],IM[S12],RE[S21],IM[S21],RE[S22],IM[S22]\n")
+        for freq, S_params_at_freq in zip(freqs.tolist(), S_params.reshape(len(freqs), 4).tolist()):
+            csv.write(",".join([repr(freq / 1e9)] + [f"{S.real!r},{S.imag!r}" for S in S_params_at_freq]) + "\n")
+
+
+@pytest.fixture
+def resonator_csv(tmp_path) -> SonnetCSVOutputFile:
+    """A SonnetCSVOutputFile for the resonator."""
+    write_sonnet_csv(tmp_path / "resonator.csv", freqs, resonator_S_params(freqs, f0, qr, qc))
+    return SonnetCSVOutputFile("resonator.csv", file_path=str(tmp_path))
+
+
+def test_get_three_dB_BW__matches_analytic(resonator_csv):
+    # |S21|**2 = ((1 - a)**2 + b**2) / (1 + b**2) with a = qr/qc and
+    # b = 2*qr*(f/f0 - 1), so the -3dB points are at b = +-sqrt(...).
+    a = qr / qc
+    half_power = 10 ** (-3 / 10)
+    b = np.sqrt((half_power - (1 - a) ** 2) / (1 - half_power))
+    analytic_three_dB_BW = f0 * b / qr
+
+    # The old spline over all of the data was about 7Hz off for this freq step.
+    assert resonator_csv.get_three_dB_BW() == pytest.approx(analytic_three_dB_BW, abs=10)
+
+
+@pytest.fixture(params=["pyarrow", "loadtxt"])
+def csv_reader(request, monkeypatch) -> str:
+    """Read csvs with pyarrow, or with np.loadtxt by making pyarrow
+    unimportable."""
+    if request.param == "pyarrow":
+        pytest.importorskip("pyarrow")
+    else:
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+        monkeypatch.setitem(sys.modules, "pyarrow.csv", None)
+    return request.param
+
+
+@pytest.fixture
+def small_csv(tmp_path, csv_reader) -> tuple[SonnetCSVOutputFile, np.ndarray, np.ndarray]:
+    """A SonnetCSVOutputFile for a few freqs with a different value for
+    every S param, along with those freqs and S params."""
+    small_freqs = np.array([1.0e9, 1.1e9, 1.25e9, 1.5e9, 2.0e9])
+    S_params = (np.arange(4 * len(small_freqs)) + 1j * np.arange(4 * len(small_freqs))[::-1]).reshape(len(small_freqs), 2, 2) / 100
+    write_sonnet_csv(tmp_path / "small.csv", small_freqs, S_params)
+    return SonnetCSVOutputFile("small", file_path=str(tmp_path)), small_freqs, S_params
+
+
+def test_SonnetCSVOutputFile__file_data(small_csv):
+    son_csv, small_freqs, S_params = small_csv
+
+    assert son_csv.file_data.shape == (len(small_freqs), 9)
+    assert son_csv.file_data.dtype == np.float64
+    assert son_csv.file_data_col_names[0] == "Frequency (GHz)"
+    np.testing.assert_array_equal(son_csv.file_data[:, 0], small_freqs / 1e9)
+    RE_S21_col = son_csv.file_data_col_names.index("RE[S21]")
+    IM_S21_col = son_csv.file_data_col_names.index("IM[S21]")
+    np.testing.assert_array_equal(son_csv.file_data[:, RE_S21_col], S_params[:, 1, 0].real)
+    np.testing.assert_array_equal(son_csv.file_data[:, IM_S21_col], S_params[:, 1, 0].imag)
+    np.testing.assert_allclose(son_csv.freqs, small_freqs, rtol=1e-15)
+
+
+def test_SonnetCSVOutputFile__S_params(small_csv):
+    son_csv, small_freqs, S_params = small_csv
+
+    assert son_csv.S_params.shape == (len(small_freqs), 2, 2)
+    assert son_csv.S_params.dtype == np.complex128
+    np.testing.assert_array_equal(son_csv.S_params, S_params)
+
+
+def test_SonnetCSVOutputFile__S_mag_and_S_mag_dB(small_csv):
+    son_csv, small_freqs, S_params = small_csv
+
+    for port1, port2 in [(1, 1), (1, 2), (2, 1), (2, 2)]:
+        S_mag = np.abs(S_params[:, port1 - 1, port2 - 1])
+        np.testing.assert_allclose(son_csv.get_S_mag(port1, port2), S_mag, rtol=1e-15)
+        np.testing.assert_allclose(son_csv.get_S_mag_dB(port1, port2), 20 * np.log10(S_mag), rtol=1e-12)
+
+    np.testing.assert_array_equal(son_csv.S21_mag, son_csv.get_S_mag(2, 1))
+    np.testing.assert_array_equal(son_csv.S21_mag_dB, son_csv.get_S_mag_dB(2, 1))
+
+
+def test_get_Q_values__fits_resonator_once(resonator_csv, monkeypatch):
+    qi = 1 / ((1 / qr) - (1 / qc))
+
+    QR, QC, QI = resonator_csv.get_Q_values()
+
+    assert QR == pytest.approx(qr, rel=1e-6)
+    assert QC == pytest.approx(qc, rel=1e-6)
+    assert QI == pytest.approx(qi, rel=1e-6)
+
+    # A second call reuses the first fit rather than fitting again.
+    def leastsq_not_allowed(*args, **kwargs):
+        raise AssertionError("get_Q_values fitted the data again")
+
+    monkeypatch.setattr("scipy.optimize.leastsq", leastsq_not_allowed)
+    assert resonator_csv.get_Q_values() == [QR, QC, QI]
+
+
+def test_get_resonant_freq__uneven_freq_steps(tmp_path):
+    # Alternating 2kHz and 8kHz steps like the uneven spacing of an
+    # adaptive sweep, with the resonance between the freq points.
+    uneven_freqs = 1.99e9 + np.concatenate([[0], np.cumsum(np.where(np.arange(4000) % 2, 8e3, 2e3))])
+    off_grid_f0 = 2.002003e9
+    write_sonnet_csv(tmp_path / "uneven.csv", uneven_freqs, resonator_S_params(uneven_freqs, off_grid_f0, qr, qc))
+    son_csv = SonnetCSVOutputFile("uneven.csv", file_path=str(tmp_path))
+
+    # Assuming even steps either side of the lowest point is about 1.7kHz off here.
+    assert son_csv.get_resonant_freq() == pytest.approx(off_grid_f0, abs=150)
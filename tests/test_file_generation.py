@@ -30,6 +30,14 @@ tests - file_generation.py.
         [X] - make file with adaptive sweep changed
 
         [X] - make file with linear sweep changed
+
+        [X] - output file already exists with on_exists="error"
+        [X] - output file already exists with on_exists="skip"
+
+    generate_files_like function testing.
+        [X] - make many files from one base file
+        [X] - make many files with max_workers > 1 same as one after another
+        [X] - many jobs with max_workers > 1 writing the same output file
 """
 
 desired_output_files_path = r"tests/test_files/test_desired_output_files"
@@ -547,3 +555,178 @@ def test_generate_file_like__linear_sweep_changed() -> None:
     generated_file_matches_desired_output = filecmp.cmp(generated_file, desired_output_file)
 
     assert generated_file_matches_desired_output
+
+
+def test_generate_file_like__output_file_exists_error() -> None:
+    base_filename = base_filename_to_edit
+    output_filename = inspect.stack()[0][3]  # current function name
+    base_file_path = base_file_path_to_edit
+    output_file_path = generated_output_file_path
+
+    # make the file so it already exists.
+    file_generation.generate_file_like(
+        base_filename=base_filename,
+        output_filename=output_filename,
+        base_file_path=base_file_path,
+        output_file_path=output_file_path,
+    )
+
+    # check that is raises a FileExistsError
+    with pytest.raises(FileExistsError):
+        file_generation.generate_file_like(
+            base_filename=base_filename,
+            output_filename=output_filename,
+            base_file_path=base_file_path,
+            output_file_path=output_file_path,
+            on_exists="error",
+        )
+
+
+def test_generate_file_like__output_file_exists_skip() -> None:
+    base_filename = base_filename_to_edit
+    output_filename = inspect.stack()[0][3]  # current function name
+    base_file_path = base_file_path_to_edit
+    output_file_path = generated_output_file_path
+
+    # make the file with no alterations so it already exists.
+    file_generation.generate_file_like(
+        base_filename=base_filename,
+        output_filename=output_filename,
+        base_file_path=base_file_path,
+        output_file_path=output_file_path,
+    )
+    generated_file = os.path.join(output_file_path, f"{output_filename}.son")
+    modified_time = os.stat(generated_file).st_mtime_ns
+
+    # check that the existing file is left as it is.
+    file_generation.generate_file_like(
+        base_filename=base_filename,
+        output_filename=output_filename,
+        base_file_path=base_file_path,
+        output_file_path=output_file_path,
+        params_to_edit={"COUPLER": 222},
+        on_exists="skip",
+    )
+
+    desired_output_file = os.path.join(desired_output_files_path, "test_generate_file_like__no_alterations.son")
+
+    generated_file_matches_desired_output = filecmp.cmp(generated_file, desired_output_file, shallow=False)
+
+    assert generated_file_matches_desired_output
+    assert os.stat(generated_file).st_mtime_ns == modified_time
+
+
+def test_generate_files_like__many_files() -> None:
+    base_filename = base_filename_to_edit
+    base_file_path = base_file_path_to_edit
+    output_file_path = generated_output_file_path
+    output_filename_suffix = "__from_generate_files_like"
+    jobs = [
+        {
+            "output_filename": "test_generate_file_like__1_param_changed",
+            "output_file_path": output_file_path,
+            "output_filename_suffix": output_filename_suffix,
+            "params_to_edit": {"COUPLER": 222},
+        },
+        {
+            "output_filename": "test_generate_file_like__adaptive_sweep_changed",
+            "output_file_path": output_file_path,
+            "output_filename_suffix": output_filename_suffix,
+            "adaptive_sweeps_to_edit": {"sweep_min": 8.5, "sweep_max": 10.5, "target_freqs": 500},
+        },
+    ]
+
+    file_generation.generate_files_like(
+        base_filename=base_filename,
+        jobs=jobs,
+        base_file_path=base_file_path,
+    )
+
+    # compare each output to the desired output.
+    for job in jobs:
+        output_filename = job["output_filename"]
+        generated_filename = f"{output_filename}{output_filename_suffix}.son"
+        generated_file = os.path.join(output_file_path, generated_filename)
+
+        desired_output_file = os.path.join(desired_output_files_path, f"{output_filename}.son")
+
+        generated_file_matches_desired_output = filecmp.cmp(generated_file, desired_output_file)
+
+        assert generated_file_matches_desired_output
+
+
+def test_generate_files_like__many_files_max_workers() -> None:
+    base_filename = base_filename_to_edit
+    base_file_path = base_file_path_to_edit
+    output_file_path = generated_output_file_path
+    edits = [
+        {"params_to_edit": {"COUPLER": 222}},
+        {"general_metals_to_edit": {"Al": {"Rdc": 0.5, "Rrf": 0.6, "Xdc": 0.7, "Ls": 0.8}}},
+        {"adaptive_sweeps_to_edit": {"sweep_min": 8.5, "sweep_max": 10.5, "target_freqs": 500}},
+        {"linear_sweeps_to_edit": {"sweep_min": 1.5, "sweep_max": 2.5, "step_size": 0.01}},
+    ]
+
+    generated_files = {}
+    for max_workers in [1, 4]:
+        output_filename_suffix = f"__from_generate_files_like_max_workers_{max_workers}"
+        jobs = [
+            {
+                "output_filename": f"test_generate_files_like__many_files_max_workers__{job_no}",
+                "output_file_path": output_file_path,
+                "output_filename_suffix": output_filename_suffix,
+                **edit,
+            }
+            for job_no, edit in enumerate(edits)
+        ]
+
+        file_generation.generate_files_like(
+            base_filename=base_filename,
+            jobs=jobs,
+            base_file_path=base_file_path,
+            max_workers=max_workers,
+        )
+
+        generated_files[max_workers] = [
+            os.path.join(output_file_path, f"{job['output_filename']}{output_filename_suffix}.son") for job in jobs
+        ]
+
+    # compare each output made with many workers to the one made sequentially.
+    for sequential_file, threaded_file in zip(generated_files[1], generated_files[4]):
+        generated_file_matches_sequential_output = filecmp.cmp(sequential_file, threaded_file, shallow=False)
+
+        assert generated_file_matches_sequential_output
+
+
+def test_generate_files_like__same_output_file_max_workers(tmp_path) -> None:
+    base_filename = base_filename_to_edit
+    base_file_path = base_file_path_to_edit
+    output_file_path = str(tmp_path)
+    output_filename = "same_output_file"
+    desired_outputs = {
+        "test_generate_file_like__1_param_changed": {"params_to_edit": {"COUPLER": 222}},
+        "test_generate_file_like__adaptive_sweep_changed": {
+            "adaptive_sweeps_to_edit": {"sweep_min": 8.5, "sweep_max": 10.5, "target_freqs": 500}
+        },
+    }
+    jobs = [
+        {"output_filename": output_filename, "output_file_path": output_file_path, **edit}
+        for _ in range(20)
+        for edit in desired_outputs.values()
+    ]
+
+    file_generation.generate_files_like(
+        base_filename=base_filename,
+        jobs=jobs,
+        base_file_path=base_file_path,
+        max_workers=8,
+    )
+
+    # the output is all from one of the jobs and no temp files are left.
+    generated_file = os.path.join(output_file_path, f"{output_filename}.son")
+    generated_file_matches_a_desired_output = any(
+        filecmp.cmp(generated_file, os.path.join(desired_output_files_path, f"{desired_output}.son"), shallow=False)
+        for desired_output in desired_outputs
+    )
+
+    assert generated_file_matches_a_desired_output
+    assert os.listdir(output_file_path) == [f"{output_filename}.son"]
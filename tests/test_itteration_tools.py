@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+import yaml
+
+from sonnetsuiteshelper import itteration_tools
+from sonnetsuiteshelper.itteration_tools import SimpleSingleParamOptimiser, step_optimisers
+
+"""
+tests - itteration_tools.py.
+    SimpleSingleParamOptimiser testing.
+        [X] - shrink step with the last value off the mesh grid
+        [X] - next value within the first 3 batches is not the last value
+        [X] - mesh step towards the desired value from below and above
+        [X] - load a yaml cache written by older versions
+            with the LibYAML loader and the pure python fallback
+
+    step_optimisers function testing.
+        [X] - step a finished and an unfinished optimiser
+"""
+
+base_filename_to_edit = r"general_base_file.son"
+base_file_path_to_edit = r"tests/test_files/test_base_files"
+
+
+def write_resonator_csv(csv_file: str, f0: float) -> None:
+    """Write a sonnet csv output file for a resonator at f0."""
+    freqs = np.arange(f0 - 2e7, f0 + 2e7 + 1, 1e4)
+    qr, qc = 2.0e4, 3.0e4
+    s21 = 1 - (qr / qc) / (1 + 2j * qr * (freqs / f0 - 1))
+    s11 = 1 - s21
+    with open(csv_file, "w") as csv:
+        csv.write('"Sonnet Data File"\nS-Param,Real-Imag,R 50.00000\n')
+        csv.write("FREQUENCY (GHz),RE[S11],IM[S11],RE[S12],IM[S12],RE[S21],IM[S21],RE[S22],IM[S22]\n")
+        for freq, s11_val, s21_val in zip(freqs.tolist(), s11.tolist(), s21.tolist()):
+            csv.write(
+                f"{freq / 1e9!r},{s11_val.real!r},{s11_val.imag!r},{s21_val.real!r},{s21_val.imag!r},"
+                f"{s21_val.real!r},{s21_val.imag!r},{s11_val.real!r},{s11_val.imag!r}\n"
+            )
+
+
+def make_optimiser(unique_name: str, desired_output_param_value: float) -> SimpleSingleParamOptimiser:
+    """Make a SimpleSingleParamOptimiser for f0 that has analysed its first
+    batch at 2GHz."""
+    return SimpleSingleParamOptimiser(
+        unique_name,
+        "COUPLER",
+        "start.son",
+        "",
+        "start.csv",
+        "",
+        1030,
+        "f0",
+        desired_output_param_value,
+        1e-4,
+        "+",
+        ignore_loading_cache=True,
+    )
+
+
+# A yaml cache in the format written by older versions.
+legacy_cache_file_contents = """---
+name: 'legacy_opt'
+correlation: 1
+variable_param_name: 'COUPLER'
+variable_param_values: [1030, np.float64(1630.0), np.float64(1330.0)]
+desired_output_param: 'f0'
+desired_output_param_value: 2000300000.0
+desired_output_param_value_tolerence_percent: 1e-05
+desired_output_param_values: [np.float64(2000000000.0), np.float64(2000600000.0), np.float64(2000310000.0)]
+next_variable_param_value: np.float64(1330.0)
+sonnet_mesh_size: 1.0
+batch_1_son_filename: 'start.son'
+batch_1_son_file_path: ''
+batch_1_output_filename: 'start.csv'
+batch_1_output_file_path: ''
+"""
+
+
+@pytest.fixture
+def in_tmp_path(tmp_path, monkeypatch):
+    """Run in a temporary directory holding the first batch files."""
+    shutil.copy(os.path.join(base_file_path_to_edit, base_filename_to_edit), tmp_path / "start.son")
+    monkeypatch.chdir(tmp_path)
+    write_resonator_csv("start.csv", 2.0e9)
+
+
+def load_optimiser_from_cache(variable_param_values: list, desired_output_param_values: list) -> SimpleSingleParamOptimiser:
+    """Write a json cache with these results for an f0 optimiser and make
+    the optimiser, which loads it."""
+    os.makedirs("OptCache", exist_ok=True)
+    cached_state = dict(
+        name="cached_opt",
+        correlation=1,
+        variable_param_name="COUPLER",
+        variable_param_values=variable_param_values,
+        desired_output_param="f0",
+        desired_output_param_value=2.0003e9,
+        desired_output_param_value_tolerence_percent=1e-4,
+        desired_output_param_values=desired_output_param_values,
+        next_variable_param_value=variable_param_values[-1],
+        sonnet_mesh_size=1.0,
+        batch_1_son_filename="start.son",
+        batch_1_son_file_path="",
+        batch_1_output_filename="start.csv",
+        batch_1_output_file_path="",
+    )
+    with open(os.path.join("OptCache", "SSPOC_cached_opt.json"), "w") as cache_file:
+        json.dump(cached_state, cache_file)
+
+    optimiser = SimpleSingleParamOptimiser("cached_opt", "COUPLER", "start.son", "", "start.csv", "", 1030, "f0", 2.0003e9, 1e-4, "+")
+    assert optimiser.loaded_cache
+    return optimiser
+
+
+def test_shrink_step_to_unsimulated_value__last_value_off_mesh_grid(in_tmp_path):
+    # e.g. after generate_next_batch with override_variable_param_value=1100.5
+    optimiser = load_optimiser_from_cache([1100.0, 1100.5], [2.0e9, 2.0e9])
+
+    assert optimiser.shrink_step_to_unsimulated_value(1100.0) == 1100.5
+
+
+def test_get_next_variable_param_value__not_last_value_in_first_batches(in_tmp_path):
+    # The percent scale rounds back to the last value when close to the desired value.
+    optimiser = load_optimiser_from_cache([1030.0, 1031.0], [2.0e9, 2.0003e9 - 100])
+
+    next_variable_param_value = optimiser.get_next_variable_param_value()
+
+    assert next_variable_param_value not in optimiser.variable_param_values
+    assert next_variable_param_value == 1032.0
+
+
+@pytest.mark.parametrize(
+    "variable_param_values, desired_output_param_values, next_variable_param_value",
+    [
+        # last output below the desired value so step up.
+        ([1030.0, 1031.0], [2.0e9, 2.0003e9 - 100], 1032.0),
+        # last output above the desired value so step down.
+        ([1032.0, 1031.0], [2.0006e9, 2.0003e9 + 100], 1030.0),
+    ],
+    ids=["output_below_desired", "output_above_desired"],
+)
+def test_change_variable_param_value_by_mesh_step__towards_desired_value(
+    in_tmp_path, variable_param_values, desired_output_param_values, next_variable_param_value
+):
+    optimiser = load_optimiser_from_cache(variable_param_values, desired_output_param_values)
+
+    assert optimiser.change_variable_param_value_by_mesh_step() == next_variable_param_value
+    # The percent scale rounds back to the last value so the mesh step is used.
+    assert optimiser.get_next_variable_param_value() == next_variable_param_value
+
+
+def test_step_optimisers__skips_finished_optimiser(in_tmp_path):
+    finished_optimiser = make_optimiser("finished_opt", 2.0e9)
+    unfinished_optimiser = make_optimiser("unfinished_opt", 2.0003e9)
+    assert finished_optimiser.last_result_reached_optimisation()
+    assert not unfinished_optimiser.last_result_reached_optimisation()
+
+    # Only the unfinished optimiser has a next batch to analyze.
+    os.makedirs(unfinished_optimiser.get_last_analysis_file_path(), exist_ok=True)
+    output_file = os.path.join(unfinished_optimiser.get_last_analysis_file_path(), unfinished_optimiser.get_last_analysis_filename())
+    write_resonator_csv(output_file, 2.0002e9)
+
+    step_optimisers([finished_optimiser, unfinished_optimiser])
+
+    assert finished_optimiser.get_current_batch_no() == 1
+    assert unfinished_optimiser.get_current_batch_no() == 2
+
+
+# CSafeLoader only exists when pyyaml was built with LibYAML.
+yaml_safe_loaders = [yaml.SafeLoader] + ([yaml.CSafeLoader] if hasattr(yaml, "CSafeLoader") else [])
+
+
+@pytest.mark.parametrize("yaml_safe_loader", yaml_safe_loaders, ids=lambda loader: loader.__name__)
+def test_load_cached_results__legacy_yaml_cache(in_tmp_path, monkeypatch, yaml_safe_loader):
+    monkeypatch.setattr(itteration_tools, "_YamlSafeLoader", yaml_safe_loader)
+    os.makedirs("OptCache")
+    with open(os.path.join("OptCache", "SSPOC_legacy_opt.yml"), "w") as cache_file:
+        cache_file.write(legacy_cache_file_contents)
+
+    optimiser = SimpleSingleParamOptimiser("legacy_opt", "COUPLER", "start.son", "", "start.csv", "", 1030, "f0", 2.0003e9, 1e-5, "+")
+
+    assert optimiser.loaded_cache
+    np.testing.assert_array_equal(optimiser.variable_param_values, [1030.0, 1630.0, 1330.0])
+    np.testing.assert_array_equal(optimiser.desired_output_param_values, [2.0e9, 2.0006e9, 2.00031e9])
+    assert optimiser.desired_output_param_value_tolerence_percent == 1e-5
+    assert optimiser.next_variable_param_value == 1330.0
+    # 2.00031e9 is within 2.0003e9 +- 0.001%.
+    assert optimiser.last_result_reached_optimisation()